@@ -0,0 +1,209 @@
+"""
+Import benchmark: synthetic data generators, scenarios, and measurements.
+
+Every scenario imports a synthetic file of the `ImportExample` model rows using a representative set of reflections,
+and measures the throughput, the peak memory allocated while importing, and the number of database queries.
+"""
+import os
+import platform
+import time
+import tracemalloc
+
+import numpy
+import pandas
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files import File
+from django.db import connections, router
+from django.utils import timezone
+
+from django_import.import_task import import_file
+from django_import.models import ImportLog
+from django_import.version import __version__
+
+from .models import ImportExample
+
+
+PREFIX = 'bench-'
+USERS = 10
+
+FORMATS = {
+    'csv': ('csv', {'format': 'csv'}),
+    'xlsx': ('xlsx', {'format': 'excel', 'parameters': {'engine': 'openpyxl'}}),
+    'ods': ('ods', {'format': 'excel', 'parameters': {'engine': 'odf'}}),
+    'json': ('jsonl', {'format': 'json', 'parameters': {'lines': True}}),
+    'parquet': ('parquet', {'format': 'parquet'}),
+}
+
+SCENARIOS = {
+    'direct': {
+        'user': 'avoid',
+        'kind': 'avoid',
+    },
+    'clean': {
+        'quantity': 'clean',
+        'weight': 'clean',
+        'user': 'avoid',
+        'kind': 'avoid',
+    },
+    'enum': {
+        'user': 'avoid',
+        'kind': {
+            'function': 'enum',
+            'parameters': {
+                'column': 'type',
+                'mapping': {'S': 'steel', 'W': 'wood', 'O': 'oil'},
+            },
+        },
+    },
+    'lookup': {
+        'kind': 'avoid',
+        'user': {
+            'function': 'lookup',
+            'parameters': {'lookup_field': 'username'},
+        },
+    },
+    'combine': {
+        'user': 'avoid',
+        'kind': 'avoid',
+        'name': {
+            'function': 'combine',
+            'parameters': {
+                'reflections': [
+                    {'function': 'format', 'parameters': {'format': '%(name)s/%(type)s'}},
+                    {'function': 'substr', 'parameters': {'length': 128}},
+                ],
+            },
+        },
+    },
+}
+
+
+def generate_dataset(rows, columns=0, seed=0):
+    """
+    Generates a dataset of `ImportExample` rows, having a number of additional not imported columns
+    """
+    random = numpy.random.RandomState(seed)
+    data = {
+        'name': ['%s%s' % (PREFIX, i) for i in range(rows)],
+        'quantity': random.randint(0, 100000, rows),
+        'weight': random.uniform(0, 1000, rows).round(3),
+        'price': random.uniform(0, 10000, rows).round(2),
+        'type': random.choice(['S', 'W', 'O'], rows),
+        'user': ['%su%s' % (PREFIX, i) for i in random.randint(0, USERS, rows)],
+    }
+    for column in range(columns):
+        data['extra_%02d' % column] = random.uniform(0, 1, rows).round(6)
+    return pandas.DataFrame(data)
+
+
+def write_dataset(dataset, format, path):
+    """
+    Writes the dataset to the file of the format, raises `ImportError` if the format is not supported
+    """
+    if format == 'csv':
+        dataset.to_csv(path, index=False)
+    elif format == 'xlsx':
+        dataset.to_excel(path, index=False, engine='openpyxl')
+    elif format == 'ods':
+        dataset.to_excel(path, index=False, engine='odf')
+    elif format == 'json':
+        dataset.to_json(path, orient='records', lines=True)
+    elif format == 'parquet':
+        dataset.to_parquet(path, index=False)
+    else:
+        raise ValueError('Unknown format: %s' % format)
+
+
+def prepare():
+    """
+    Creates users referred by the generated data, and removes rows imported before
+    """
+    for i in range(USERS):
+        User.objects.get_or_create(username='%su%s' % (PREFIX, i))
+    ImportExample.objects.filter(name__startswith=PREFIX).delete()
+
+
+class QueryCounter(object):
+    """
+    Database execute wrapper counting queries
+    """
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def run_import(path, options):
+    """
+    Imports the file without creating the job, returns the log
+    """
+    log = ImportLog(options=options)
+    log.started_at = timezone.now()
+    with open(path, 'rb') as source:
+        import_file(log, ImportExample, File(source, name=path), options)
+    log.finished_at = timezone.now()
+    return log
+
+
+def run_scenario(path, scenario, format, options, memory=True):
+    """
+    Runs the scenario importing the file, and returns measurements
+    """
+    options = dict(options, reflections=SCENARIOS[scenario])
+    options.update(FORMATS[format][1])
+    connection = connections[router.db_for_write(ImportExample)]
+    counter = QueryCounter()
+
+    prepare()
+    started = time.time()
+    if hasattr(connection, 'execute_wrapper'):
+        with connection.execute_wrapper(counter):
+            log = run_import(path, options)
+    else:
+        log = run_import(path, options)
+    seconds = time.time() - started
+
+    peak = None
+    if memory:
+        prepare()
+        tracemalloc.start()
+        try:
+            run_import(path, options)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    prepare()
+    return {
+        'scenario': scenario,
+        'format': format,
+        'rows': log.rows_read,
+        'imported': log.rows_imported,
+        'errored': log.rows_errored,
+        'seconds': round(seconds, 4),
+        'rows_per_second': round(log.rows_read / seconds, 1) if seconds else None,
+        'peak_memory': peak,
+        'queries': counter.count,
+    }
+
+
+def environment():
+    """
+    Returns a description of the benchmark environment
+    """
+    connection = connections[router.db_for_write(ImportExample)]
+    return {
+        'version': __version__,
+        'python': platform.python_version(),
+        'django': __import__('django').get_version(),
+        'pandas': pandas.__version__,
+        'numpy': numpy.__version__,
+        'database': connection.vendor,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'debug': settings.DEBUG,
+        'timestamp': timezone.now().isoformat(),
+    }
@@ -0,0 +1,93 @@
+import json
+import os
+import shutil
+import tempfile
+
+from tests.benchmark import (
+    FORMATS,
+    SCENARIOS,
+    environment,
+    generate_dataset,
+    run_scenario,
+    write_dataset,
+)
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Measures the import throughput, peak memory, and the number of queries for synthetic files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000, help='Number of rows in generated files')
+        parser.add_argument('--columns', type=int, default=0, help='Number of additional not imported columns')
+        parser.add_argument('--formats', default='csv', help='Comma-separated list of formats: %s' % ', '.join(sorted(FORMATS)))
+        parser.add_argument('--scenarios', default=','.join(sorted(SCENARIOS)), help='Comma-separated list of scenarios')
+        parser.add_argument('--batch-size', type=int, help='The batch_size option')
+        parser.add_argument('--chunk-size', type=int, help='The chunk_size option')
+        parser.add_argument('--workers', type=int, help='The workers option')
+        parser.add_argument('--engine', help='The engine option')
+        parser.add_argument('--vectorize', action='store_true', default=False, help='The vectorize option')
+        parser.add_argument('--no-memory', action='store_true', default=False, help='Do not measure the peak memory')
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the random data generator')
+        parser.add_argument('--output', help='Path to the JSON file to write results to')
+        parser.add_argument('--compare', help='Path to the JSON file with results to compare with')
+
+    def handle(self, *av, **options):
+        formats = [f for f in options['formats'].split(',') if f]
+        scenarios = [s for s in options['scenarios'].split(',') if s]
+        for name in set(formats) - set(FORMATS):
+            raise CommandError('Unknown format: %s' % name)
+        for name in set(scenarios) - set(SCENARIOS):
+            raise CommandError('Unknown scenario: %s' % name)
+        import_options = {'vectorize': options['vectorize']}
+        for name in ('batch_size', 'chunk_size', 'workers', 'engine'):
+            if options[name] is not None:
+                import_options[name] = options[name]
+
+        dataset = generate_dataset(options['rows'], options['columns'], options['seed'])
+        results = []
+        directory = tempfile.mkdtemp()
+        try:
+            for format in formats:
+                path = os.path.join(directory, 'benchmark.%s' % FORMATS[format][0])
+                try:
+                    write_dataset(dataset, format, path)
+                except ImportError as ex:
+                    self.stderr.write('Format %s skipped: %s' % (format, ex))
+                    continue
+                for scenario in scenarios:
+                    result = run_scenario(path, scenario, format, import_options, memory=not options['no_memory'])
+                    results.append(result)
+                    self.stdout.write(
+                        '%(scenario)s/%(format)s: %(rows)s rows, %(rows_per_second)s rows/s, '
+                        '%(peak_memory)s bytes peak, %(queries)s queries' % result
+                    )
+        finally:
+            shutil.rmtree(directory)
+
+        report = {
+            'environment': environment(),
+            'parameters': dict(import_options, rows=options['rows'], columns=options['columns'], seed=options['seed']),
+            'results': results,
+        }
+        if options['compare']:
+            self.compare(results, options['compare'])
+        if options['output']:
+            with open(options['output'], 'wt') as output:
+                json.dump(report, output, indent=2, sort_keys=True)
+        else:
+            self.stdout.write(json.dumps(report, indent=2, sort_keys=True))
+
+    def compare(self, results, path):
+        with open(path, 'rt') as previous:
+            previous = dict(((r['scenario'], r['format']), r) for r in json.load(previous)['results'])
+        for result in results:
+            before = previous.get((result['scenario'], result['format']))
+            if not before or not before['rows_per_second'] or not result['rows_per_second']:
+                continue
+            self.stdout.write('%s/%s: %+.1f%% rows/s, %+d queries' % (
+                result['scenario'], result['format'],
+                100.0 * (result['rows_per_second'] - before['rows_per_second']) / before['rows_per_second'],
+                result['queries'] - before['queries'],
+            ))
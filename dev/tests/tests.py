@@ -1,19 +1,78 @@
 from __future__ import absolute_import, print_function
 
+import bz2
+import gzip
+import json
 import os
 import sys
+import tempfile
+import threading
 import unittest
+import zipfile
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
 from decimal import Decimal
+from io import BytesIO, StringIO
 
+import pandas
 from tests.models import ImportExample
 
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.models import ContentType
 from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.utils import timezone
 
-from django_import.models import ImportJob
+from django_import.changes import ChangeDetector
+from django_import.dtypes import (
+    convert_date,
+    convert_datetime,
+    convert_integer,
+)
+from django_import.import_task import import_file, resume_import
+from django_import.models import ImportJob, ImportLog, ImportRun
+from django_import.readers import (
+    READERS,
+    iterate_dataset,
+    project,
+    register_reader,
+)
+from django_import.reflector import LookupCache, register_reflection
+from django_import.worker import claim, process
+from django_import.writers import store_creates
+
+
+PROFILES = []
+
+
+def profile_hook(log, summary):
+    PROFILES.append((log.id, summary))
+
+
+@contextmanager
+def on_commit_callbacks():
+    """Executes on_commit callbacks registered inside, like captureOnCommitCallbacks() of Django 3.2+"""
+    start = len(connection.run_on_commit)
+    yield
+    callbacks = connection.run_on_commit[start:]
+    del connection.run_on_commit[start:]
+    for callback in callbacks:
+        callback[1]()
+
+
+class RemoteStorage(FileSystemStorage):
+    """Storage not having local paths of files"""
+    def path(self, name):
+        raise NotImplementedError()
+
+    def _open(self, name, mode='rb'):
+        with open(super(RemoteStorage, self).path(name), mode) as local:
+            return ContentFile(local.read(), name=name)
 
 
 class ModuleTest(TestCase):
@@ -27,6 +86,11 @@ class ModuleTest(TestCase):
                 os.remove(j.upload_file.path)
             except Exception:
                 pass
+            for log in j.logs.all():
+                try:
+                    os.remove(log.rejects_file.path)
+                except Exception:
+                    pass
         ImportJob.objects.all().delete()
 
     def test_001_basic_import(self):
@@ -535,3 +599,1189 @@ class ModuleTest(TestCase):
             ('cvb', {'name': 'cvb', 'quantity': 112, 'weight': None, 'price': None, 'kind': 'wood', 'user': self.u2}),
             ('ete', {'name': 'ete', 'quantity': 123, 'weight': None, 'price': None, 'kind': 'steel', 'user': self.u1}),
         ]))
+
+    def test_012_batch_import(self):
+        """Test batched import of identity-less rows"""
+        options = {
+            "reflections": {
+                "user": {
+                    "parameters": {
+                        "lookup_field": "username"
+                    },
+                    "function": "lookup"
+                },
+                "kind": {
+                    "parameters": {
+                        "mapping": {
+                            "S": "steel",
+                            "W": "wood",
+                            "O": "oil"
+                        },
+                        "column": "type"
+                    },
+                    "function": "enum"
+                }
+            },
+            "batch_size": 10
+        }
+        with open(os.path.join(settings.BASE_DIR, 'tests/data/test.csv'), 'rb') as test_file:
+            meta = ImportExample._meta
+            ct = ContentType.objects.get_by_natural_key(meta.app_label, meta.model_name)
+            job = ImportJob.objects.create(upload_file=File(test_file, name='test.csv'), model=ct, options=options)
+        self.assertEqual(job.logs.all().count(), 1)
+        log = job.logs.all()[0]
+        self.assertEqual(log.is_finished, True)
+        self.assertEqual(ImportExample.objects.all().count(), 2, log.import_log)
+        examples = dict([(e.name, dict([(f.name, getattr(e, f.name)) for f in e._meta.get_fields() if f.name != 'id'])) for e in ImportExample.objects.all()])
+        self.assertEqual(examples, dict([
+            ('cvbncv', {'name': 'cvbncv', 'quantity': 112, 'weight': 54.333, 'price': Decimal('34.12'), 'kind': 'wood', 'user': self.u2}),
+            ('etewrt', {'name': 'etewrt', 'quantity': 123, 'weight': 10.3, 'price': Decimal('11.11'), 'kind': 'steel', 'user': self.u1}),
+        ]))
+
+    def test_013_batch_import_fallback(self):
+        """Test that wrong rows are skipped when the batch fails"""
+        options = {
+            "reflections": {
+                "name": {
+                    "parameters": {
+                        "mapping": {
+                            "etewrt": "etewrt",
+                            "cvbncv": None
+                        }
+                    },
+                    "function": "enum"
+                },
+                "user": "avoid"
+            },
+            "batch_size": 10
+        }
+        with open(os.path.join(settings.BASE_DIR, 'tests/data/test.csv'), 'rb') as test_file:
+            meta = ImportExample._meta
+            ct = ContentType.objects.get_by_natural_key(meta.app_label, meta.model_name)
+            job = ImportJob.objects.create(upload_file=File(test_file, name='test.csv'), model=ct, options=options)
+        log = job.logs.all()[0]
+        self.assertEqual(log.is_finished, True)
+        self.assertEqual(ImportExample.objects.all().count(), 1, log.import_log)
+        self.assertEqual(ImportExample.objects.all()[0].name, 'etewrt')
+        self.assertIn('Database error while importing data', log.import_log_text())
+
+    def test_014_batch_upsert(self):
+        """Test batched import of identified rows"""
+        options = {
+            "reflections": {
+                "user": {
+                    "parameters": {
+                        "lookup_field": "username"
+                    },
+                    "function": "lookup"
+                },
+                "kind": {
+                    "parameters": {
+                        "mapping": {
+                            "S": "steel",
+                            "W": "wood",
+                            "O": "oil"
+                        },
+                        "column": "type"
+                    },
+                    "function": "enum"
+                }
+            },
+            "identity": [
+                "name"
+            ],
+            "batch_size": 10
+        }
+        ImportExample.objects.create(name='etewrt', quantity=1, kind='oil')
+        with open(os.path.join(settings.BASE_DIR, 'tests/data/test.csv'), 'rb') as test_file:
+            meta = ImportExample._meta
+            ct = ContentType.objects.get_by_natural_key(meta.app_label, meta.model_name)
+            job = ImportJob.objects.create(upload_file=File(test_file, name='test.csv'), model=ct, options=options)
+        log = job.logs.all()[0]
+        self.assertEqual(log.is_finished, True)
+        self.assertEqual(ImportExample.objects.all().count(), 2, log.import_log)
+        job.save()
+        self.assertEqual(job.logs.all().count(), 2)
+        self.assertEqual(ImportExample.objects.all().count(), 2)
+        examples = dict([(e.name, dict([(f.name, getattr(e, f.name)) for f in e._meta.get_fields() if f.name != 'id'])) for e in ImportExample.objects.all()])
+        self.assertEqual(examples, dict([
+            ('cvbncv', {'name': 'cvbncv', 'quantity': 112, 'weight': 54.333, 'price': Decimal('34.12'), 'kind': 'wood', 'user': self.u2}),
+            ('etewrt', {'name': 'etewrt', 'quantity': 123, 'weight': 10.3, 'price': Decimal('11.11'), 'kind': 'steel', 'user': self.u1}),
+        ]))
+
+        # fields missing in some rows keep values of existent instances
+        User.objects.create(username='keep', first_name='Keep')
+        store_creates(User, ['username'], [
+            {'username': 'keep', 'last_name': 'Kept'},
+            {'username': 'other', 'first_name': 'Other', 'last_name': 'New'},
+        ])
+        self.assertEqual(User.objects.values_list('first_name', 'last_name').get(username='keep'), ('Keep', 'Kept'))
+        self.assertEqual(User.objects.values_list('first_name', 'last_name').get(username='other'), ('Other', 'New'))
+
+        # identity-less and identified rows are stored in order of the batch
+        ImportExample.objects.all().delete()
+        store_creates(ImportExample, ['name'], [
+            {'kind': 'oil', 'quantity': 1},
+            {'name': 'first', 'kind': 'oil', 'quantity': 2},
+            {'kind': 'oil', 'quantity': 3},
+            {'kind': 'oil', 'quantity': 4},
+            {'name': 'second', 'kind': 'oil', 'quantity': 5},
+        ])
+        self.assertEqual(list(ImportExample.objects.order_by('id').values_list('quantity', flat=True)), [1, 2, 3, 4, 5])
+
+    def test_015_chunked_import(self):
+        """Test import reading the file by chunks"""
+        options = {
+            "reflections": {
+                "user": {
+                    "parameters": {
+                        "lookup_field": "username"
+                    },
+                    "function": "lookup"
+                },
+                "kind": {
+                    "parameters": {
+                        "mapping": {
+                            "S": "steel",
+                            "W": "wood",
+                            "O": "oil"
+                        },
+                        "column": "type"
+                    },
+                    "function": "enum"
+                }
+            },
+            "identity": [
+                "name"
+            ],
+            "chunk_size": 1
+        }
+        with open(os.path.join(settings.BASE_DIR, 'tests/data/test.csv'), 'rb') as test_file:
+            meta = ImportExample._meta
+            ct = ContentType.objects.get_by_natural_key(meta.app_label, meta.model_name)
+            job = ImportJob.objects.create(upload_file=File(test_file, name='test.csv'), model=ct, options=options)
+        log = job.logs.all()[0]
+        self.assertEqual(log.is_finished, True)
+        self.assertIn('reading by chunks of 1 rows', log.import_log_text())
+        self.assertEqual(ImportExample.objects.all().count(), 2, log.import_log)
+        examples = dict([(e.name, dict([(f.name, getattr(e, f.name)) for f in e._meta.get_fields() if f.name != 'id'])) for e in ImportExample.objects.all()])
+        self.assertEqual(examples, dict([
+            ('cvbncv', {'name': 'cvbncv', 'quantity': 112, 'weight': 54.333, 'price': Decimal('34.12'), 'kind': 'wood', 'user': self.u2}),
+            ('etewrt', {'name': 'etewrt', 'quantity': 123, 'weight': 10.3, 'price': Decimal('11.11'), 'kind': 'steel', 'user': self.u1}),
+        ]))
+
+    def test_016_format_reflection(self):
+        """Test `format` reflection getting values from the whole row"""
+        options = {
+            "reflections": {
+                "name": {
+                    "function": "format",
+                    "parameters": {
+                        "format": "%(name)s-%(type)s-%(quantity)s"
+                    }
+                },
+                "user": "avoid",
+            },
+            "identity": [
+                "name"
+            ]
+        }
+        with open(os.path.join(settings.BASE_DIR, 'tests/data/test.csv'), 'rb') as test_file:
+            meta = ImportExample._meta
+            ct = ContentType.objects.get_by_natural_key(meta.app_label, meta.model_name)
+            job = ImportJob.objects.create(upload_file=File(test_file, name='test.csv'), model=ct, options=options)
+        log = job.logs.all()[0]
+        self.assertEqual(log.is_finished, True)
+        self.assertEqual(ImportExample.objects.all().count(), 2, log.import_log)
+        examples = set([e.name for e in ImportExample.objects.all()])
+        self.assertEqual(examples, set(['etewrt-S-123', 'cvbncv-W-112']))
+
+        # rows are presented as read-only mappings
+        rows = list(iterate_dataset(pandas.DataFrame({'name': ['a', 'b'], 'quantity': [1, 2]})))
+        index, row = rows[1]
+        self.assertEqual(index, 1)
+        self.assertEqual(list(row.keys()), ['name', 'quantity'])
+        self.assertEqual(list(row.values()), ['b', 2])
+        self.assertEqual(dict(row.items()), {'name': 'b', 'quantity': 2})
+        self.assertEqual((row.get('name'), row.get('absent')), ('b', None))
+
+    def test_017_vectorized_import(self):
+        """Test import using vectorized reflections"""
+        options = {
+            "format": "csv",
+            "parameters": {
+                "delimiter": ";"
+            },
+            "mode": "rt",
+            "vectorize": True,
+            "reflections": {
+                "name": {
+                    "function": "substr",
+                    "parameters": {
+                        "start": 0,
+                        "length": 3
+                    }
+                },
+                "user": {
+                    "parameters": {
+                        "lookup_field": "username"
+                    },
+                    "function": "lookup"
+                },
+                "weight": {
+                    "function": "combine",
+                    "parameters": {
+                        "reflections": [
+                            {
+                                "function": "replace",
+                                "parameters": {
+                                    "search": ",",
+                                    "replace": "."
+                                }
+                            },
+                            {
+                                "function": "clean"
+                            }
+                        ]
+                    }
+                },
+                "price": {
+                    "function": "combine",
+                    "parameters": {
+                        "reflections": [
+                            {
+                                "function": "replace",
+                                "parameters": {
+                                    "search": ",",
+                                    "replace": "."
+                                }
+                            },
+                            {
+                                "function": "clean"
+                            }
+                        ]
+                    }
+                },
+                "kind": {
+                    "function": "enum",
+                    "parameters": {
+                        "column": "type",
+                        "mapping": {
+                            "S": "steel",
+                            "W": "wood",
+                            "O": "oil"
+                        }
+                    }
+                }
+            },
+            "identity": [
+                "name"
+            ]
+        }
+        with open(os.path.join(settings.BASE_DIR, 'tests/data/test-ru.csv'), 'rb') as test_file:
+            meta = ImportExample._meta
+            ct = ContentType.objects.get_by_natural_key(meta.app_label, meta.model_name)
+            job = ImportJob.objects.create(upload_file=File(test_file, name='test-ru.csv'), model=ct, options=options)
+        log = job.logs.all()[0]
+        self.assertEqual(log.is_finished, True)
+        self.assertNotIn('Vectorized reflection', log.import_log_text())
+        self.assertEqual(ImportExample.objects.all().count(), 2, log.import_log)
+        examples = dict([(e.name, dict([(f.name, getattr(e, f.name)) for f in e._meta.get_fields() if f.name != 'id'])) for e in ImportExample.objects.all()])
+        self.assertEqual(examples, dict([
+            ('cvb', {'name': 'cvb', 'quantity': 112, 'weight': 54.333, 'price': Decimal('34.12'), 'kind': 'wood', 'user': self.u2}),
+            ('ete', {'name': 'ete', 'quantity': 123, 'weight': 10.3, 'price': Decimal('11.11'), 'kind': 'steel', 'user': self.u1}),
+        ]))
+
+    def test_018_invalid_reflections(self):
+        """Test that the whole reflection plan is validated before import"""
+        options = {
+            "reflections": {
+                "user": "avoid",
+                "weight": {
+                    "function": "combine",
+                    "parameters": {
+                        "reflections": [
+                            "unknown",
+                            "clean"
+                        ]
+                    }
+                },
+                "kind": {
+                    "function": "enum",
+                    "parameters": {
+                        "columns": "type"
+                    }
+                }
+            }
+        }
+        with open(os.path.join(settings.BASE_DIR, 'tests/data/test.csv'), 'rb') as test_file:
+            meta = ImportExample._meta
+            ct = ContentType.objects.get_by_natural_key(meta.app_label, meta.model_name)
+            job = ImportJob.objects.create(upload_file=File(test_file, name='test.csv'), model=ct, options=options)
+        log = job.logs.all()[0]
+        self.assertEqual(log.is_finished, True)
+        self.assertEqual(ImportExample.objects.all().count(), 0, log.import_log)
+        self.assertIn('Import options are not valid', log.import_log_text())
+        self.assertIn('Reflection function unknown has not been registered: weight', log.import_log_text())
+        self.assertIn('Wrong parameters of the reflection enum: kind', log.import_log_text())
+
+    def test_019_lookup_cache(self):
+        """Test caching of the `lookup` reflection"""
+        options = {
+            "reflections": {
+                "user": {
+                    "parameters": {
+                        "lookup_field": "username"
+                    },
+                    "function": "lookup"
+                },
+                "kind": {
+                    "parameters": {
+                        "mapping": {
+                            "S": "steel",
+                            "W": "wood",
+                            "O": "oil"
+                        },
+                        "column": "type"
+                    },
+                    "function": "enum"
+                }
+            },
+            "identity": [
+                "name"
+            ]
+        }
+        with open(os.path.join(settings.BASE_DIR, 'tests/data/test-users.csv'), 'rb') as test_file:
+            meta = ImportExample._meta
+            ct = ContentType.objects.get_by_natural_key(meta.app_label, meta.model_name)
+            job = ImportJob.objects.create(upload_file=File(test_file, name='test-users.csv'), model=ct, options=options)
+        log = job.logs.all()[0]
+        self.assertEqual(log.is_finished, True)
+        self.assertEqual(ImportExample.objects.all().count(), 6, log.import_log)
+        # distinct values of the chunk are prefetched, rows hit the cache only
+        self.assertIn('Lookup cache: 6 hits, 3 misses', log.import_log_text())
+        users = dict([(e.name, e.user) for e in ImportExample.objects.all()])
+        self.assertEqual(users, {
+            'etewrt': self.u1, 'cvbncv': self.u2, 'qwerty': self.u1,
+            'asdfgh': None, 'zxcvbn': self.u2, 'poiuyt': None,
+        })
+
+        options['vectorize'] = True
+        options['reflections']['user']['parameters']['preload'] = True
+        job.options = options
+        job.save()
+        log = job.logs.order_by('-id')[0]
+        self.assertEqual(ImportExample.objects.all().count(), 6, log.import_log)
+        self.assertIn('Lookup cache: 3 hits, 0 misses', log.import_log_text())
+        users = dict([(e.name, e.user) for e in ImportExample.objects.all()])
+        self.assertEqual(users, {
+            'etewrt': self.u1, 'cvbncv': self.u2, 'qwerty': self.u1,
+            'asdfgh': None, 'zxcvbn': self.u2, 'poiuyt': None,
+        })
+
+        # found and missing values are resolved by the only query
+        lookups = LookupCache(100)
+        with self.assertNumQueries(1):
+            found = lookups.resolve(User, 'username', ['u1', 'u2', 'x1', 'x2', 'x3', 'x4'])
+        self.assertEqual(found, {'u1': self.u1, 'u2': self.u2, 'x1': None, 'x2': None, 'x3': None, 'x4': None})
+        with self.assertNumQueries(0):
+            lookups.resolve(User, 'username', ['u1', 'x1'])
+
+        # values not valid for the lookup field are not found
+        with self.assertNumQueries(1):
+            found = lookups.resolve(User, 'pk', ['abc', self.u1.pk])
+        self.assertEqual(found, {'abc': None, self.u1.pk: self.u1})
+        found = lookups.resolve(User, 'pk', ['abc', self.u2.pk], preload=True)
+        self.assertEqual(found, {'abc': None, self.u2.pk: self.u2})
+
+    def test_020_batch_transactions(self):
+        """Test that wrong rows are found in the failed batch stored row by row"""
+        options = {
+            "reflections": {
+                "name": {
+                    "parameters": {
+                        "mapping": {
+                            "etewrt": "etewrt",
+                            "cvbncv": "cvbncv",
+                            "qwerty": None,
+                            "asdfgh": "asdfgh",
+                            "zxcvbn": "zxcvbn",
+                            "poiuyt": "poiuyt"
+                        }
+                    },
+                    "function": "enum"
+                },
+                "user": "avoid",
+                "user_name": {
+                    "function": "update",
+                    "parameters": {
+                        "column": "user"
+                    }
+                }
+            },
+            "identity": [
+                "name"
+            ],
+            "batch_size": 10,
+            "bulk": False
+        }
+        with open(os.path.join(settings.BASE_DIR, 'tests/data/test-users.csv'), 'rb') as test_file:
+            meta = ImportExample._meta
+            ct = ContentType.objects.get_by_natural_key(meta.app_label, meta.model_name)
+            job = ImportJob.objects.create(upload_file=File(test_file, name='test-users.csv'), model=ct, options=options)
+        log = job.logs.all()[0]
+        self.assertEqual(log.is_finished, True)
+        self.assertEqual(ImportExample.objects.all().count(), 5, log.import_log)
+        self.assertEqual(log.import_log_text().count('Database error while importing data'), 1)
+        self.assertIn('Import has been finished, 5 rows successfully imported', log.import_log_text())
+        users = dict([(e.name, e.user) for e in ImportExample.objects.all()])
+        self.assertEqual(users, {
+            'etewrt': self.u1, 'cvbncv': self.u2,
+            'asdfgh': None, 'zxcvbn': self.u2, 'poiuyt': None,
+        })
+
+    def test_021_log_entries(self):
+        """Test that the log is written as separate entries with row numbers"""
+        options = {
+            "reflections": {
+                "name": {
+                    "parameters": {
+                        "mapping": {
+                            "etewrt": "etewrt",
+                            "cvbncv": None
+                        }
+                    },
+                    "function": "enum"
+                },
+                "user": "avoid"
+            }
+        }
+        with open(os.path.join(settings.BASE_DIR, 'tests/data/test.csv'), 'rb') as test_file:
+            meta = ImportExample._meta
+            ct = ContentType.objects.get_by_natural_key(meta.app_label, meta.model_name)
+            job = ImportJob.objects.create(upload_file=File(test_file, name='test.csv'), model=ct, options=options)
+        log = job.logs.all()[0]
+        self.assertEqual(log.is_finished, True)
+        self.assertEqual(log.import_log, '')
+        self.assertEqual(ImportExample.objects.all().count(), 1, log.import_log_text())
+        error = log.entries.get(level=2)
+        self.assertEqual(error.row, 1)
+        self.assertIn('Database error while importing data', error.message)
+        self.assertEqual(log.entries.last().message, 'Finished')
+        self.assertIn('Database error while importing data', log.import_log_html())
+
+    def test_022_progress_counters(self):
+        """Test progress counters of the log"""
+        options = {
+            "reflections": {
+                "name": {
+                    "parameters": {
+                        "mapping": {
+                            "etewrt": "etewrt",
+                            "cvbncv": None
+                        }
+                    },
+                    "function": "enum"
+                },
+                "user": "avoid"
+            },
+            "chunk_size": 1
+        }
+        with open(os.path.join(settings.BASE_DIR, 'tests/data/test.csv'), 'rb') as test_file:
+            meta = ImportExample._meta
+            ct = ContentType.objects.get_by_natural_key(meta.app_label, meta.model_name)
+            job = ImportJob.objects.create(upload_file=File(test_file, name='test.csv'), model=ct, options=options)
+        log = job.logs.all()[0]
+        self.assertEqual(log.is_finished, True)
+        self.assertEqual(log.rows_read, 2, log.import_log_text())
+        self.assertEqual(log.rows_imported, 1)
+        self.assertEqual(log.rows_errored, 1)
+        self.assertEqual(log.rows_skipped, 0)
+        self.assertEqual(log.current_chunk, 2)
+        self.assertEqual(log.bytes_total, job.upload_file.size)
+        self.assertTrue(log.started_at <= log.finished_at)
+        self.assertEqual(set(log.stages), set(['prepare', 'read', 'import']))
+        self.assertTrue(all('finished' in stage for stage in log.stages.values()))
+        self.assertIsNone(log.eta())
+
+    def test_023_rejects_file(self):
+        """Test rejected rows stored to the rejects file"""
+        options = {
+            "reflections": {
+                "name": {
+                    "parameters": {
+                        "mapping": {
+                            "etewrt": "etewrt",
+                            "cvbncv": None
+                        }
+                    },
+                    "function": "enum"
+                },
+                "user": "avoid"
+            },
+            "batch_size": 10,
+            "rejects": True
+        }
+        with open(os.path.join(settings.BASE_DIR, 'tests/data/test.csv'), 'rb') as test_file:
+            meta = ImportExample._meta
+            ct = ContentType.objects.get_by_natural_key(meta.app_label, meta.model_name)
+            job = ImportJob.objects.create(upload_file=File(test_file, name='test.csv'), model=ct, options=options)
+        log = job.logs.all()[0]
+        self.assertEqual(log.is_finished, True)
+        self.assertEqual(ImportExample.objects.count(), 1, log.import_log_text())
+        self.assertTrue(log.rejects_file.name.endswith('.rejects.csv'))
+        self.assertIn('1 rejected rows have been stored', log.import_log_text())
+        with log.rejects_file.open('rb') as rejects_file:
+            rejects = pandas.read_csv(rejects_file)
+        self.assertEqual(list(rejects.columns), ["name", "quantity", "weight", "price", "type", "user", "import_row", "import_error"])
+        self.assertEqual(list(rejects['name']), ['cvbncv'])
+        self.assertEqual(list(rejects['import_row']), [1])
+
+        # source values are written as they have been read, not converted to kinds of fields
+        options['rejects'] = 'jsonl'
+        job.options = options
+        job.save()
+        log = job.logs.order_by('-id')[0]
+        with log.rejects_file.open('rb') as rejects_file:
+            rejects = [json.loads(line) for line in rejects_file.read().decode('utf-8').splitlines()]
+        self.assertEqual(rejects, [{
+            'name': 'cvbncv', 'quantity': 112, 'weight': 54.333, 'price': '34.12', 'type': 'W', 'user': 'u2',
+            'import_row': 1, 'import_error': rejects[0]['import_error'],
+        }])
+
+    def test_024_dry_run(self):
+        """Test validation without storing data"""
+        options = {
+            "reflections": {
+                "name": {
+                    "parameters": {
+                        "mapping": {
+                            "etewrt": "etewrt",
+                            "cvbncv": None
+                        }
+                    },
+                    "function": "enum"
+                },
+                "user": "avoid"
+            },
+            "batch_size": 10,
+            "vectorize": True,
+            "dry_run": True
+        }
+        with open(os.path.join(settings.BASE_DIR, 'tests/data/test.csv'), 'rb') as test_file:
+            meta = ImportExample._meta
+            ct = ContentType.objects.get_by_natural_key(meta.app_label, meta.model_name)
+            job = ImportJob.objects.create(upload_file=File(test_file, name='test.csv'), model=ct, options=options)
+        log = job.logs.all()[0]
+        self.assertEqual(log.is_finished, True)
+        self.assertEqual(ImportExample.objects.count(), 0)
+        text = log.import_log_text()
+        self.assertIn('Dry run has been finished, 1 rows are valid', text)
+        self.assertIn('Errors by field: name: 1', text)
+        self.assertIn('Errors by type: null: 1', text)
+        self.assertIn('Throughput, rows per second', text)
+        self.assertEqual(log.rows_errored, 1)
+
+    def test_025_resume_import(self):
+        """Test resuming the interrupted import from the checkpoint"""
+        options = {
+            "reflections": {
+                "user": "avoid",
+                "kind": {
+                    "parameters": {
+                        "mapping": {
+                            "S": "steel",
+                            "W": "wood",
+                            "O": "oil"
+                        },
+                        "column": "type"
+                    },
+                    "function": "enum"
+                }
+            },
+            "batch_size": 2,
+            "chunk_size": 4
+        }
+        with open(os.path.join(settings.BASE_DIR, 'tests/data/test-users.csv'), 'rb') as test_file:
+            meta = ImportExample._meta
+            ct = ContentType.objects.get_by_natural_key(meta.app_label, meta.model_name)
+            job = ImportJob.objects.create(upload_file=File(test_file, name='test-users.csv'), model=ct, options=options)
+        log = job.logs.all()[0]
+        self.assertEqual(log.checkpoint, 6, log.import_log_text())
+        self.assertEqual(log.options, options)
+
+        # simulate the import interrupted after the second batch
+        ImportExample.objects.filter(name__in=['zxcvbn', 'poiuyt']).delete()
+        ImportLog.objects.filter(id=log.id).update(is_finished=False, checkpoint=4, rows_read=4, rows_imported=4)
+        ImportJob.objects.filter(id=job.id).update(options={"reflections": {"name": "unknown"}})
+
+        # the import having written entries recently is considered still running
+        log = ImportLog.objects.get(id=log.id)
+        self.assertEqual(log.is_running(), True)
+        log.entries.update(created_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(log.is_running(), False)
+
+        resume_import(log.id)
+        log = ImportLog.objects.get(id=log.id)
+        self.assertEqual(log.is_finished, True)
+        self.assertIn('Resuming import', log.import_log_text())
+        self.assertEqual(log.checkpoint, 6)
+        self.assertEqual(log.rows_read, 6)
+        self.assertEqual(log.rows_imported, 6)
+        self.assertEqual(sorted(e.name for e in ImportExample.objects.all()), sorted(['etewrt', 'cvbncv', 'qwerty', 'asdfgh', 'zxcvbn', 'poiuyt']))
+
+    def test_026_skip_unchanged(self):
+        """Test skipping rows not changed since the last import"""
+        options = {
+            "reflections": {
+                "user": "avoid",
+                "kind": "avoid"
+            },
+            "identity": ["name"],
+            "batch_size": 10,
+            "skip_unchanged": True
+        }
+        with open(os.path.join(settings.BASE_DIR, 'tests/data/test-users.csv'), 'rb') as test_file:
+            content = test_file.read()
+        meta = ImportExample._meta
+        ct = ContentType.objects.get_by_natural_key(meta.app_label, meta.model_name)
+        job = ImportJob.objects.create(upload_file=ContentFile(content, name='test-users.csv'), model=ct, options=options)
+        log = job.logs.order_by('id').last()
+        self.assertEqual(log.rows_imported, 6, log.import_log_text())
+        self.assertEqual(log.rows_unchanged, 0)
+
+        job.save()
+        log = job.logs.order_by('id').last()
+        self.assertEqual(log.rows_imported, 0, log.import_log_text())
+        self.assertEqual(log.rows_unchanged, 6)
+
+        job.upload_file.delete(save=False)
+        job.upload_file = ContentFile(content.replace(b'3.50', b'3.75'), name='test-users.csv')
+        job.save()
+        log = job.logs.order_by('id').last()
+        self.assertEqual(log.rows_imported, 1, log.import_log_text())
+        self.assertEqual(log.rows_unchanged, 5)
+        self.assertEqual(ImportExample.objects.get(name='asdfgh').price, Decimal('3.75'))
+        self.assertEqual(ImportExample.objects.count(), 6)
+
+        # reflected values are hashed, keys depend on options, and rows failed to be hashed are changed
+        detector = ChangeDetector(ImportExample, ['name', 'quantity'], options)
+        key, digest = detector.digest({'name': 'qwerty', 'price': Decimal('3.50')}, {'kind': 'oil'})
+        self.assertEqual(detector.digest({'name': 'qwerty', 'price': Decimal('3.50')}, {'kind': 'oil'}), (key, digest))
+        self.assertNotEqual(detector.digest({'name': 'qwerty', 'price': Decimal('3.50')}, {'kind': 'wood'})[1], digest)
+        other = ChangeDetector(ImportExample, ['name', 'quantity'], dict(options, batch_size=5))
+        self.assertNotEqual(other.digest({'name': 'qwerty', 'price': Decimal('3.50')}, {'kind': 'oil'})[0], key)
+        self.assertIsNone(detector.digest({'name': 'qwerty', 'quantity': 'many'}, None))
+
+    def test_027_duplicate_imports(self):
+        """Test skipping and coalescing duplicate imports"""
+        options = {
+            "reflections": {
+                "user": "avoid",
+                "kind": "avoid"
+            },
+            "identity": ["name"]
+        }
+        meta = ImportExample._meta
+        ct = ContentType.objects.get_by_natural_key(meta.app_label, meta.model_name)
+        # the file is not hashed if duplicates are imported
+        with open(os.path.join(settings.BASE_DIR, 'tests/data/test.csv'), 'rb') as test_file:
+            job = ImportJob.objects.create(upload_file=File(test_file, name='test.csv'), model=ct, options=options)
+        self.assertEqual((job.file_hash, job.fingerprint, job.logs.get().fingerprint), ('', '', ''))
+
+        with self.settings(DJANGO_IMPORT={'duplicates': 'skip'}):
+            with open(os.path.join(settings.BASE_DIR, 'tests/data/test.csv'), 'rb') as test_file:
+                job = ImportJob.objects.create(upload_file=File(test_file, name='test.csv'), model=ct, options=options)
+            self.assertEqual(len(job.fingerprint), 64)
+            self.assertEqual(job.logs.count(), 1)
+            job.save()
+            self.assertEqual(job.logs.count(), 1)
+            self.assertIn('Duplicate import skipped', job.logs.get().import_log_text())
+
+            job.options = dict(options, batch_size=10)
+            job.save()
+            self.assertEqual(job.logs.count(), 2)
+
+        with self.settings(DJANGO_IMPORT={'duplicates': 'coalesce'}):
+            job.save()
+            self.assertEqual(job.logs.count(), 3)
+            queued = ImportLog.objects.create(job=job, options=job.options, fingerprint=job.fingerprint)
+            job.options = options
+            job.fingerprint = job.get_fingerprint()
+            self.assertEqual(job.coalesce(), queued)
+            queued = ImportLog.objects.get(id=queued.id)
+            self.assertEqual(queued.options, options)
+            self.assertEqual(queued.fingerprint, job.fingerprint)
+
+    def test_028_database_queue(self):
+        """Test imports queued in the database"""
+        options = {
+            "reflections": {
+                "user": "avoid",
+                "kind": "avoid"
+            },
+            "identity": ["name"],
+            "batch_size": 2
+        }
+        meta = ImportExample._meta
+        ct = ContentType.objects.get_by_natural_key(meta.app_label, meta.model_name)
+        with self.settings(DJANGO_IMPORT={'sync': 'queue'}):
+            with on_commit_callbacks():
+                with open(os.path.join(settings.BASE_DIR, 'tests/data/test-users.csv'), 'rb') as test_file:
+                    job = ImportJob.objects.create(upload_file=File(test_file, name='test-users.csv'), model=ct, options=options)
+            log = job.logs.get()
+            self.assertEqual(log.runs.count(), 1)
+            self.assertEqual(ImportExample.objects.count(), 0)
+
+            run = claim('worker')
+            self.assertEqual(run.attempts, 1)
+            self.assertIsNone(claim('other'))
+            process(run)
+            log = ImportLog.objects.get(id=log.id)
+            self.assertEqual(log.is_finished, True)
+            self.assertEqual(log.runs.count(), 0)
+            self.assertEqual(ImportExample.objects.count(), 6)
+
+            # the lost run is claimed again and resumed from the checkpoint
+            ImportLog.objects.filter(id=log.id).update(is_finished=False, checkpoint=4)
+            stale = timezone.now() - timedelta(hours=1)
+            ImportRun.objects.create(log=log, claimed_by='lost', claimed_at=stale, heartbeat_at=stale, attempts=1)
+            run = claim('worker')
+            self.assertEqual(run.attempts, 2)
+            process(run)
+            log = ImportLog.objects.get(id=log.id)
+            self.assertEqual(log.is_finished, True)
+            self.assertIn('Resuming import', log.import_log_text())
+            self.assertEqual(log.runs.count(), 0)
+
+            # the run claimed by another worker is aborted without finishing the log
+            ImportLog.objects.filter(id=log.id).update(is_finished=False, checkpoint=4)
+            aborted = threading.Event()
+            aborted.set()
+            resume_import(log.id, aborted)
+            log = ImportLog.objects.get(id=log.id)
+            self.assertEqual(log.is_finished, False)
+            self.assertIn('Import has been aborted before the row 4', log.import_log_text())
+            self.assertEqual(log.checkpoint, 4)
+
+    def test_029_import_file_command(self):
+        """Test importing the local file by the management command"""
+        options = {
+            "reflections": {
+                "user": "avoid",
+                "kind": "avoid"
+            },
+            "identity": ["name"]
+        }
+        path = os.path.join(settings.BASE_DIR, 'tests/data/test-users.csv')
+        with tempfile.NamedTemporaryFile('wt', suffix='.json', delete=False) as options_file:
+            json.dump(options, options_file)
+        try:
+            stdout = StringIO()
+            call_command(
+                'import_file', 'tests.ImportExample', path, '--options', options_file.name, '--batch-size', '4', '--no-job',
+                stdout=stdout, stderr=StringIO()
+            )
+            self.assertEqual(ImportExample.objects.count(), 6)
+            self.assertEqual(ImportJob.objects.count(), 0)
+            self.assertIn('6 rows read, 6 imported', stdout.getvalue())
+
+            # the file located outside of the storage is copied there
+            with open(path, 'rb') as test_file, tempfile.NamedTemporaryFile('wb', suffix='.csv', delete=False) as outside:
+                outside.write(test_file.read())
+            ImportExample.objects.all().delete()
+            stdout = StringIO()
+            call_command(
+                'import_file', 'tests.ImportExample', outside.name, '--options', options_file.name, '--chunk-size', '4',
+                stdout=stdout, stderr=StringIO()
+            )
+            self.assertEqual(ImportExample.objects.count(), 6)
+            job = ImportJob.objects.get()
+            self.assertIn('File has been copied to the storage: %s' % job.upload_file.name, stdout.getvalue())
+            self.assertNotEqual(os.path.realpath(job.upload_file.path), os.path.realpath(outside.name))
+            log = job.logs.get()
+            self.assertEqual(log.is_finished, True)
+            self.assertEqual(log.rows_imported, 6)
+            self.assertEqual(log.current_chunk, 2)
+
+            # the file located in the storage is referred without copying
+            inside = os.path.join(settings.MEDIA_ROOT, 'test-command.csv')
+            with open(path, 'rb') as test_file, open(inside, 'wb') as inside_file:
+                inside_file.write(test_file.read())
+            ImportExample.objects.all().delete()
+            stdout = StringIO()
+            call_command('import_file', 'tests.ImportExample', inside, '--options', options_file.name, stdout=stdout, stderr=StringIO())
+            self.assertEqual(ImportExample.objects.count(), 6)
+            job = ImportJob.objects.order_by('id').last()
+            self.assertEqual(job.upload_file.name, 'test-command.csv')
+            self.assertNotIn('File has been copied', stdout.getvalue())
+        finally:
+            os.remove(options_file.name)
+            os.remove(outside.name)
+
+    def test_030_benchmark(self):
+        """Test the benchmark suite on small synthetic files"""
+        with tempfile.NamedTemporaryFile('rt', suffix='.json') as output:
+            call_command('import_benchmark', '--rows', '50', '--formats', 'csv,json', '--batch-size', '20', '--output', output.name, stdout=StringIO())
+            report = json.load(output)
+        self.assertEqual(report['environment']['database'], 'sqlite')
+        self.assertEqual(len(report['results']), 10)
+        for result in report['results']:
+            self.assertEqual(result['imported'], 50, result)
+            self.assertTrue(result['rows_per_second'] > 0)
+            self.assertTrue(result['peak_memory'] > 0)
+            if hasattr(connection, 'execute_wrapper'):
+                self.assertTrue(result['queries'] > 0)
+
+    @unittest.skipIf(not hasattr(connection, 'execute_wrapper'), "queries are counted only by Django 2.0+")
+    def test_031_profile(self):
+        """Test timings and query counts of import stages"""
+        options = {
+            "reflections": {
+                "user": {
+                    "parameters": {
+                        "lookup_field": "username"
+                    },
+                    "function": "lookup"
+                },
+                "kind": "avoid"
+            },
+            "identity": ["name"],
+            "batch_size": 2,
+            "profile": True
+        }
+        meta = ImportExample._meta
+        ct = ContentType.objects.get_by_natural_key(meta.app_label, meta.model_name)
+        with self.settings(DJANGO_IMPORT={'profile_hook': 'tests.tests.profile_hook'}):
+            with open(os.path.join(settings.BASE_DIR, 'tests/data/test-users.csv'), 'rb') as test_file:
+                job = ImportJob.objects.create(upload_file=File(test_file, name='test-users.csv'), model=ct, options=options)
+        log = job.logs.get()
+        self.assertEqual(ImportExample.objects.count(), 6, log.import_log)
+        self.assertEqual(PROFILES, [(log.id, log.profile)])
+        stages = log.profile['stages']
+        for name in ('read', 'headers', 'reflect', 'reflect:name', 'reflect:user', 'write'):
+            self.assertIn(name, stages)
+        self.assertEqual(stages['read']['calls'], 2)
+        # the user lookup is prefetched once per chunk, by the only query
+        self.assertEqual(stages['reflect:user']['calls'], 7)
+        self.assertEqual(stages['reflect:user']['queries'], 1)
+        self.assertEqual(stages['write']['calls'], 3)
+        self.assertTrue(stages['write']['queries'] >= 3)
+        self.assertTrue(stages['reflect:user']['p50'] <= stages['reflect:user']['p99'] <= stages['reflect:user']['max'])
+        self.assertEqual(log.profile['queries'], sum(s['queries'] for s in stages.values()))
+        self.assertIn('Time by stage: ', log.import_log_text())
+
+        options['profile'] = False
+        job.options = options
+        job.save()
+        log = job.logs.order_by('-id')[0]
+        self.assertNotIn('reflect:user', log.profile['stages'])
+        self.assertEqual(log.profile['stages']['reflect']['queries'], 1)
+
+    def test_032_parsing_engines(self):
+        """Test selecting parsing engines and registered readers"""
+        options = {
+            "reflections": {
+                "user": "avoid",
+                "kind": "avoid"
+            },
+            "identity": ["name"],
+            "mode": "rt",
+            "engine": ["pyarrow", "python"],
+            "parameters": {"low_memory": False}
+        }
+        meta = ImportExample._meta
+        ct = ContentType.objects.get_by_natural_key(meta.app_label, meta.model_name)
+        with open(os.path.join(settings.BASE_DIR, 'tests/data/test-users.csv'), 'rb') as test_file:
+            job = ImportJob.objects.create(upload_file=File(test_file, name='test-users.csv'), model=ct, options=options)
+        log = job.logs.get()
+        self.assertEqual(ImportExample.objects.count(), 6, log.import_log_text())
+        self.assertIn('Parsing engine python failed, trying the next one', log.import_log_text())
+        self.assertNotIn('File is parsed using', log.import_log_text())
+
+        del options['parameters']
+        job.options = options
+        job.save()
+        log = job.logs.order_by('-id')[0]
+        self.assertEqual(log.rows_imported, 6, log.import_log_text())
+        # pyarrow reads only columns used by reflections, if installed
+        try:
+            import pyarrow  # noqa: F401
+            engine = 'pyarrow'
+        except ImportError:
+            engine = 'python'
+        self.assertIn('File is parsed using the %s engine' % engine, log.import_log_text())
+
+        def read_upper(file, **parameters):
+            dataset = pandas.read_csv(file, **parameters)
+            dataset['name'] = dataset['name'].str.upper()
+            return dataset
+        register_reader('upper', read_upper)
+        try:
+            job.options = dict(options, format='upper')
+            job.save()
+        finally:
+            READERS.pop('upper')
+        log = job.logs.order_by('-id')[0]
+        self.assertEqual(log.rows_imported, 6, log.import_log_text())
+        self.assertEqual(ImportExample.objects.filter(name='ETEWRT').count(), 1)
+
+    def test_033_local_reads(self):
+        """Test reading local files by path, and spooling files of remote storages"""
+        options = {
+            "reflections": {
+                "user": "avoid",
+                "kind": "avoid"
+            },
+            "identity": ["name"],
+            "chunk_size": 2
+        }
+        meta = ImportExample._meta
+        ct = ContentType.objects.get_by_natural_key(meta.app_label, meta.model_name)
+        with open(os.path.join(settings.BASE_DIR, 'tests/data/test-users.csv'), 'rb') as test_file:
+            job = ImportJob.objects.create(upload_file=File(test_file, name='test-users.csv'), model=ct, options=options)
+        log = job.logs.get()
+        self.assertEqual(log.rows_imported, 6, log.import_log_text())
+        self.assertEqual(log.current_chunk, 3)
+        self.assertEqual(log.bytes_read, log.bytes_total)
+        self.assertIn(job.upload_file.path, log.import_log_text())
+
+        ImportExample.objects.all().delete()
+        job.upload_file.storage = RemoteStorage(location=job.upload_file.storage.location)
+        log = ImportLog.objects.create(job=job, options=options)
+        import_file(log, ImportExample, job.upload_file, options)
+        log.flush()
+        self.assertEqual(log.rows_imported, 6, log.import_log_text())
+        self.assertIn('File has been copied from the storage to the local file', log.import_log_text())
+        self.assertIn('spool', log.profile['stages'])
+
+        ImportExample.objects.all().delete()
+        job = ImportJob.objects.get(id=job.id)
+        log = ImportLog.objects.create(job=job, options=options)
+        import_file(log, ImportExample, job.upload_file, dict(options, local=False))
+        log.flush()
+        self.assertEqual(log.rows_imported, 6, log.import_log_text())
+        self.assertNotIn('spool', log.profile['stages'])
+
+    def test_034_column_projection(self):
+        """Test reading only columns used by reflections"""
+        dataset = pandas.read_csv(os.path.join(settings.BASE_DIR, 'tests/data/test-users.csv'))
+        for column in range(20):
+            dataset['extra_%02d' % column] = column
+        options = {
+            "reflections": {
+                "user": "avoid",
+                "kind": {
+                    "function": "enum",
+                    "parameters": {
+                        "column": "type",
+                        "mapping": {"S": "steel", "W": "wood", "O": "oil"}
+                    }
+                }
+            },
+            "identity": ["name"]
+        }
+        meta = ImportExample._meta
+        ct = ContentType.objects.get_by_natural_key(meta.app_label, meta.model_name)
+        job = ImportJob.objects.create(upload_file=ContentFile(dataset.to_csv(index=False).encode(), name='test-wide.csv'), model=ct, options=options)
+        log = job.logs.get()
+        self.assertEqual(log.rows_imported, 6, log.import_log_text())
+        self.assertIn('Only columns used by reflections are read: id, name, price, quantity, type, weight', log.import_log_text())
+        self.assertEqual(ImportExample.objects.filter(kind='steel').count(), 2)
+
+        self.assertEqual(project('csv', {}, ['name', 'type', 'absent'], ['type', 'extra', 'name']), {'usecols': ['type', 'name']})
+
+        def reflection_suffix(context, model, field_name, data, log, column=None):
+            return {field_name: '%s-%s' % (data['name'], data['extra_07'])}, {}
+        register_reflection('reflection_suffix', reflection_suffix)
+        try:
+            # custom reflections use the whole row, even having the column parameter
+            options['reflections']['name'] = 'suffix'
+            job.options = options
+            job.save()
+            log = job.logs.order_by('-id')[0]
+            self.assertEqual(log.rows_imported, 6, log.import_log_text())
+            self.assertIn('Some reflections may use the whole row, all columns are read', log.import_log_text())
+
+            options['columns'] = ['name', 'extra_07']
+            job.options = options
+            job.save()
+            log = job.logs.order_by('-id')[0]
+            self.assertEqual(log.rows_imported, 6, log.import_log_text())
+            self.assertIn('Only columns used by reflections are read: extra_07, id, name, price, quantity, type, weight', log.import_log_text())
+            self.assertEqual(ImportExample.objects.filter(name='etewrt-7').count(), 1)
+        finally:
+            from django_import import reflections
+            delattr(reflections, 'reflection_suffix')
+
+        options['columns'] = False
+        options['reflections'].pop('name')
+        job.options = options
+        job.save()
+        log = job.logs.order_by('-id')[0]
+        self.assertEqual(log.rows_imported, 6, log.import_log_text())
+        self.assertIn('recognized, 26 columns', log.import_log_text())
+
+    def test_035_model_dtypes(self):
+        """Test column types derived from model fields"""
+        content = (
+            'name,quantity,weight,price,type\n'
+            '007,12,1.5,11.10,S\n'
+            '008,,2.5,0.10,W\n'
+            '009,+3,,1.25,O\n'
+            '010,bad,1,2,S\n'
+        )
+        options = {
+            "reflections": {
+                "user": "avoid",
+                "quantity": "clean",
+                "kind": {
+                    "function": "enum",
+                    "parameters": {
+                        "column": "type",
+                        "mapping": {"S": "steel", "W": "wood", "O": "oil"}
+                    }
+                }
+            },
+            "identity": ["name"]
+        }
+        meta = ImportExample._meta
+        ct = ContentType.objects.get_by_natural_key(meta.app_label, meta.model_name)
+        job = ImportJob.objects.create(upload_file=ContentFile(content.encode(), name='test-types.csv'), model=ct, options=options)
+        log = job.logs.get()
+        self.assertIn('Column types derived from the model: id: integer, name: string, price: decimal, quantity: integer, weight: float', log.import_log_text())
+        self.assertEqual(log.rows_imported, 3, log.import_log_text())
+        self.assertEqual(log.rows_errored, 1, log.import_log_text())
+        values = dict((e.name, (e.quantity, e.weight, e.price)) for e in ImportExample.objects.all())
+        self.assertEqual(values, {
+            '007': (12, 1.5, Decimal('11.10')),
+            '008': (None, 2.5, Decimal('0.10')),
+            '009': (3, None, Decimal('1.25')),
+        })
+
+        options['dtypes'] = False
+        job.options = options
+        job.save()
+        log = job.logs.order_by('-id')[0]
+        self.assertNotIn('Column types derived from the model', log.import_log_text())
+        self.assertTrue(ImportExample.objects.filter(name='7').exists())
+
+        values = pandas.Series(['9007199254740993', '12345678901234567891', '1.5', None], dtype=object)
+        self.assertEqual(list(convert_integer(values)), [9007199254740993, 12345678901234567891, '1.5', None])
+        values = pandas.Series(['2023-02-13', '01/02/2023', '13/02/2023', '2023-02-30'])
+        self.assertEqual(list(convert_date(values)), [date(2023, 2, 13), '01/02/2023', '13/02/2023', '2023-02-30'])
+        values = pandas.Series(['2023-01-02T10:00+03:00', '2023-01-02 10:00+01:00', '2023-01-02 10:00', 'now'])
+        converted = list(convert_datetime(values))
+        self.assertEqual([value.utcoffset() for value in converted[:2]], [timedelta(0), timedelta(0)])
+        self.assertEqual([value.replace(tzinfo=None) for value in converted[:2]], [datetime(2023, 1, 2, 7, 0), datetime(2023, 1, 2, 9, 0)])
+        self.assertEqual(converted[2:], [datetime(2023, 1, 2, 10, 0), 'now'])
+
+    def test_036_excel_sheets(self):
+        """Test importing several sheets of the workbook, streamed by chunks and parsed"""
+        content = tempfile.SpooledTemporaryFile()
+        with pandas.ExcelWriter(content, engine='openpyxl') as writer:
+            pandas.DataFrame({
+                'name': ['s1', 's2', 's3'], 'quantity': [1, 2, 3], 'type': ['S', 'W', 'O'],
+            }).to_excel(writer, sheet_name='Orders', index=False)
+            pandas.DataFrame({'Title': ['a1', 'a2'], 'Count': [4, 5], 'Kind': ['S', 'S']}).to_excel(writer, sheet_name='Archive', index=False)
+            pandas.DataFrame({'name': ['x1']}).to_excel(writer, sheet_name='Skipped', index=False)
+        content.seek(0)
+        content = content.read()
+        options = {
+            "format": "excel",
+            "sheets": ["Orders", {"name": "Archive", "headers": ["name", "quantity", "type"]}],
+            "reflections": {
+                "user": "avoid",
+                "kind": {
+                    "function": "enum",
+                    "parameters": {"column": "type", "mapping": {"S": "steel", "W": "wood", "O": "oil"}}
+                }
+            },
+            "identity": ["name"]
+        }
+        meta = ImportExample._meta
+        ct = ContentType.objects.get_by_natural_key(meta.app_label, meta.model_name)
+        for chunk_size in (2, None):
+            ImportExample.objects.all().delete()
+            job = ImportJob.objects.create(
+                upload_file=ContentFile(content, name='test-sheets.xlsx'), model=ct, options=dict(options, chunk_size=chunk_size)
+            )
+            log = job.logs.get()
+            text = log.import_log_text()
+            self.assertIn('Reading the sheet: Orders', text)
+            self.assertIn('Reading the sheet: Archive', text)
+            self.assertNotIn('Skipped', text)
+            self.assertEqual(log.rows_imported, 5, text)
+            if not chunk_size:
+                self.assertEqual(log.rows_total, 5)
+            values = dict((e.name, (e.quantity, e.kind)) for e in ImportExample.objects.all())
+            self.assertEqual(values, {
+                's1': (1, 'steel'), 's2': (2, 'wood'), 's3': (3, 'oil'), 'a1': (4, 'steel'), 'a2': (5, 'steel'),
+            })
+
+    def test_037_compressed_files(self):
+        """Test importing compressed files and members of zip archives"""
+        def rows(prefix, count):
+            return ('name,quantity,type\n' + ''.join('%s%s,%s,S\n' % (prefix, i, i) for i in range(count))).encode()
+
+        def compress(data):
+            content = BytesIO()
+            with gzip.GzipFile(fileobj=content, mode='wb') as compressed:
+                compressed.write(data)
+            return content.getvalue()
+
+        options = {
+            "reflections": {
+                "user": "avoid",
+                "kind": {"function": "enum", "parameters": {"column": "type", "mapping": {"S": "steel"}}}
+            },
+            "identity": ["name"],
+            "batch_size": 2
+        }
+        meta = ImportExample._meta
+        ct = ContentType.objects.get_by_natural_key(meta.app_label, meta.model_name)
+
+        job = ImportJob.objects.create(upload_file=ContentFile(compress(rows('g', 3)), name='test-rows.csv.gz'), model=ct, options=options)
+        log = job.logs.get()
+        self.assertIn('File is decompressed on the fly: gzip', log.import_log_text())
+        self.assertEqual(log.rows_imported, 3, log.import_log_text())
+
+        job = ImportJob.objects.create(
+            upload_file=ContentFile(bz2.compress(rows('b', 2)), name='test-rows.csv.bz2'), model=ct,
+            options=dict(options, local=False, mode='rt'),
+        )
+        log = job.logs.get()
+        if sys.version_info < (3,):
+            # file objects compressed by bz2 can not be decompressed on the fly by python<3
+            self.assertIn('bz2 compression of file objects is not supported on this Python', log.import_log_text())
+            self.assertEqual(log.rows_imported, 0)
+        else:
+            self.assertEqual(log.rows_imported, 2, log.import_log_text())
+            self.assertEqual(log.bytes_read, log.bytes_total)
+
+        content = BytesIO()
+        with zipfile.ZipFile(content, 'w', zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr('daily/a.csv', rows('a', 3))
+            archive.writestr('daily/c.csv.gz', compress(rows('c', 2)))
+            archive.writestr('daily/readme.txt', b'not imported')
+            archive.writestr('__MACOSX/daily/._a.csv', b'not imported')
+        job = ImportJob.objects.create(
+            upload_file=ContentFile(content.getvalue(), name='test-rows.zip'), model=ct,
+            options=dict(options, members=['*.csv', '*.csv.gz'], member_workers=2),
+        )
+        log = job.logs.get()
+        text = log.import_log_text()
+        self.assertIn('Archive members to be imported: daily/a.csv, daily/c.csv.gz', text)
+        self.assertIn('member workers ignored', text)
+        self.assertIn('daily/c.csv.gz: Import has been finished, 2 rows successfully imported', text)
+        self.assertEqual((log.rows_read, log.rows_imported), (5, 5), text)
+        self.assertEqual(sorted(log.members), ['daily/a.csv', 'daily/c.csv.gz'])
+        self.assertEqual(log.members['daily/a.csv']['rows_imported'], 3)
+        self.assertEqual(log.members['daily/c.csv.gz']['rows_imported'], 2)
+        self.assertTrue(all(member['is_finished'] for member in log.members.values()))
+        self.assertEqual(ImportExample.objects.filter(name__in=['a0', 'a2', 'c1']).count(), 3)
+
+        log.resume()
+        log.refresh_from_db()
+        self.assertIn('daily/a.csv: Member has been imported already, skipped', log.import_log_text())
+        self.assertEqual((log.rows_read, log.rows_imported), (5, 5))
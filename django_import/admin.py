@@ -1,13 +1,19 @@
 import markdown
 
 from django.apps import apps
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.contrib.admin import ModelAdmin, StackedInline
 from django.contrib.contenttypes.models import ContentType
 from django.db.models import F, Value
 from django.db.models.functions import Concat
 from django.utils.safestring import mark_safe
 
+
+try:
+    from django.utils.translation import ugettext_lazy as _
+except ImportError:
+    from django.utils.translation import gettext_lazy as _
+
 from .models import ImportJob, ImportLog, get_options
 
 
@@ -15,6 +21,19 @@ class ImportLogInline(StackedInline):
     readonly_fields = [
         'imported_at',
         'is_finished',
+        'started_at',
+        'finished_at',
+        'rows_read',
+        'rows_imported',
+        'rows_skipped',
+        'rows_unchanged',
+        'rows_errored',
+        'rows_per_second',
+        'eta',
+        'checkpoint',
+        'rejects_file',
+        'profile',
+        'members',
         'import_log_html',
     ]
     model = ImportLog
@@ -40,6 +59,22 @@ class ImportJobAdmin(ModelAdmin):
     inlines = [
         ImportLogInline
     ]
+    actions = [
+        'resume_import'
+    ]
+
+    def resume_import(self, request, queryset):
+        for job in queryset:
+            log = job.logs.order_by('id').last()
+            if not log:
+                continue
+            if log.is_finished:
+                self.message_user(request, _('The last import of %s has been finished already') % job, messages.WARNING)
+            elif log.is_running():
+                self.message_user(request, _('The last import of %s is still running') % job, messages.WARNING)
+            else:
+                log.resume()
+    resume_import.short_description = _("Resume the last import from the checkpoint")
 
     def formfield_for_foreignkey(self, db_field, request, **kwargs):
         if db_field.name == 'model':
@@ -0,0 +1,153 @@
+"""
+Compressed import files are decompressed on the fly while read, the uncompressed file is not written anywhere.
+
+The compression is inferred from the file name suffix: `.gz`, `.bz2`, `.xz`, `.zst`, and `.zip`.
+Members of the zip archive matching the pattern are imported one by one, or concurrently, using the same options,
+and every member has its own progress counters, stored in the `members` attribute of the import log,
+and summed up to counters of the log.
+"""
+import bz2
+import fnmatch
+import gzip
+import io
+import os
+
+from six import PY2, string_types
+
+
+# Compression by the suffix of the file name
+COMPRESSIONS = {
+    '.gz': 'gzip',
+    '.gzip': 'gzip',
+    '.bz2': 'bz2',
+    '.xz': 'xz',
+    '.zst': 'zstd',
+    '.zip': 'zip',
+}
+
+# Attributes of the log kept for every member of the archive
+MEMBER_COUNTERS = (
+    'rows_total', 'rows_read', 'rows_imported', 'rows_skipped', 'rows_unchanged', 'rows_errored',
+    'bytes_total', 'bytes_read', 'current_chunk', 'checkpoint', 'profile', 'is_finished',
+)
+
+# Counters of members summed up to counters of the log
+MEMBER_TOTALS = ('rows_read', 'rows_imported', 'rows_skipped', 'rows_unchanged', 'rows_errored', 'bytes_read')
+
+
+def compression(name, option='infer'):
+    """
+    Returns the compression of the file using the `compression` option, inferred from the file name if `infer`
+    """
+    if option != 'infer':
+        return option or None
+    return COMPRESSIONS.get(os.path.splitext(name or '')[1].lower())
+
+
+def decompress(file, compression, mode='rb', encoding=None):
+    """
+    Returns the file object decompressing the binary file on the fly, wrapped to the text file if the `mode` is `rt`.
+
+    Raises `ImportError` if the module required by the compression is not installed,
+    or if the compression of file objects is not supported on this Python, like `bz2` and `xz` on Python 2.
+    """
+    if compression in ('bz2', 'xz') and PY2:
+        raise ImportError('%s compression of file objects is not supported on this Python' % compression)
+    if compression == 'gzip':
+        stream = gzip.GzipFile(fileobj=file, mode='rb')
+    elif compression == 'bz2':
+        stream = bz2.BZ2File(file, mode='rb')
+    elif compression == 'xz':
+        import lzma
+        stream = lzma.LZMAFile(file, mode='rb')
+    elif compression == 'zstd':
+        import zstandard
+        stream = zstandard.ZstdDecompressor().stream_reader(file)
+    else:
+        raise ValueError('Unknown compression: %s' % compression)
+    if mode == 'rt':
+        stream = io.TextIOWrapper(stream, encoding=encoding or 'utf-8')
+    return stream
+
+
+def archive_members(archive, patterns=None):
+    """
+    Returns members of the zip archive matching any of patterns, in order of the archive.
+
+    Directories and service entries, like `__MACOSX/` or hidden files, are skipped.
+    """
+    if isinstance(patterns, string_types):
+        patterns = [patterns]
+    members = []
+    for info in archive.infolist():
+        name = info.filename
+        if name.endswith('/') or name.startswith('__MACOSX/') or os.path.basename(name).startswith('.'):
+            continue
+        if patterns and not any(fnmatch.fnmatch(name, pattern) for pattern in patterns):
+            continue
+        members.append(info)
+    return members
+
+
+class MemberLog(object):
+    """
+    Log of the archive member, used by the import of the member instead of the import log.
+
+    Entries are written to the import log prefixed by the member name.
+    Progress counters are kept for the member, and summed up to counters of the import log.
+    Stages are passed to the import log only when started first time.
+    Other attributes are taken from the import log.
+    """
+    def __init__(self, log, name, lock):
+        self.log = log
+        self.name = name
+        self.lock = lock
+        self.row = None
+        self.counters = dict((log.members or {}).get(name) or {})
+
+    def __getattr__(self, name):
+        if name in MEMBER_COUNTERS:
+            return self.counters.get(name)
+        return getattr(self.log, name)
+
+    def progress(self, **counters):
+        with self.lock:
+            self.counters.update(counters)
+            members = dict(self.log.members or {})
+            members[self.name] = dict(self.counters)
+            totals = dict((k, sum(member.get(k) or 0 for member in members.values())) for k in MEMBER_TOTALS)
+            self.log.progress(members=members, **totals)
+
+    def stage(self, name=None):
+        with self.lock:
+            if name and name not in (self.log.stages or {}):
+                self.log.stage(name)
+
+    def message(self, level, chapter, format, *av, **kw):
+        values = av if av else kw
+        try:
+            message = format % values
+        except Exception:
+            message = '%s %r' % (format, values)
+        with self.lock:
+            self.log.row = self.row
+            self.log.message(level, chapter, '%s: %s', self.name, message)
+            self.log.row = None
+
+    def debug(self, format, *av, **kw):
+        return self.message(5, 'DEBUG', format, *av, **kw)
+
+    def info(self, format, *av, **kw):
+        return self.message(4, 'INFO', format, *av, **kw)
+
+    def warning(self, format, *av, **kw):
+        return self.message(3, 'WARNING', format, *av, **kw)
+
+    def error(self, format, *av, **kw):
+        return self.message(2, 'ERROR', format, *av, **kw)
+
+    def critical(self, format, *av, **kw):
+        return self.message(1, 'CRITICAL', format, *av, **kw)
+
+    def __str__(self):
+        return '%s: %s' % (self.log, self.name)
@@ -0,0 +1,77 @@
+"""
+Change detection skips rows which have not been changed since the last import.
+
+Every reflected row, i.e. values to be created and updated, is hashed before storing.
+Hashes of stored rows are kept in the `ImportHash` table by the model, the fingerprint of the model
+and import options, and the identity of the row.
+
+Rows of every batch whose hashes have not been changed are dropped before storing,
+using the only query per batch. Rows having no identity values, or failed to be hashed, are always stored.
+"""
+import hashlib
+import json
+
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import Model
+
+from .writers import _identity_key, store_creates
+
+
+def _encode(value):
+    """Internal helper encoding values not serializable to JSON, instances by the primary key"""
+    if isinstance(value, Model):
+        return [value._meta.label_lower, value.pk]
+    return repr(value)
+
+
+class ChangeDetector(object):
+    """
+    Detects unchanged rows by hashes stored by the previous import
+    """
+    def __init__(self, model, identity, options):
+        self.model = model
+        self.identity = identity
+        self.content_type = ContentType.objects.get_for_model(model)
+        self.fingerprint = hashlib.sha1(json.dumps(
+            [options, model._meta.label_lower], sort_keys=True, default=str
+        ).encode('utf-8')).hexdigest()
+
+    def digest(self, create, update):
+        """
+        Returns the key of the identity and the hash of reflected values of the row,
+        or None if the row has no identity values, or values can not be hashed
+        """
+        names = sorted(k for k in create if k in self.identity)
+        if not names:
+            return None
+        try:
+            key = _identity_key(self.model, names, [create[k] for k in names])
+            key = hashlib.sha1(repr((self.fingerprint, names, key)).encode('utf-8')).hexdigest()
+            values = json.dumps([create, update or {}], sort_keys=True, default=_encode)
+        except Exception:
+            return None
+        return key, hashlib.md5(values.encode('utf-8')).hexdigest()[:16]
+
+    def changed(self, batch, digests):
+        """
+        Returns batch items whose hashes are absent or changed since the last import
+        """
+        from .models import ImportHash
+
+        keys = [digests[item[0]][0] for item in batch if item[0] in digests]
+        if not keys:
+            return batch
+        stored = dict(ImportHash.objects.filter(model=self.content_type, key__in=keys).values_list('key', 'digest'))
+        return [item for item in batch if item[0] not in digests or stored.get(digests[item[0]][0]) != digests[item[0]][1]]
+
+    def store(self, batch, digests):
+        """
+        Stores hashes of stored batch items
+        """
+        from .models import ImportHash
+
+        creates = [
+            {'model': self.content_type, 'key': digests[item[0]][0], 'digest': digests[item[0]][1]}
+            for item in batch if item[0] in digests
+        ]
+        store_creates(ImportHash, ['model', 'key'], creates)
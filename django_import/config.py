@@ -17,9 +17,21 @@ DJANGO_IMPORT = {
         'sessions.Session',
         'django_import.ImportJob',
         'django_import.ImportLog',
+        'django_import.ImportLogEntry',
+        'django_import.ImportHash',
+        'django_import.ImportRun',
     ],
     'sync': True,
+    'duplicates': 'import',
+    'coalesce_interval': 3600,
+    'queue_heartbeat': 10,
+    'queue_timeout': 60,
+    'queue_attempts': 3,
     'rows_report': 1000,
+    'lookup_cache_size': 10000,
+    'log_flush_count': 100,
+    'log_flush_interval': 5,
+    'profile_hook': None,
 }
 
 
@@ -0,0 +1,209 @@
+"""
+Column types are derived from model fields filled by the `direct`, `update`, and `clean` reflections.
+
+Text and decimal columns are read as strings by the parser, to keep leading zeros and all decimal digits.
+Numeric, decimal, and date columns are converted chunk by chunk, integers exactly, and dates using only ISO formats
+accepted by Django, values which can not be converted are left as is, to be reported by the field validation when stored.
+
+Missing values of all columns are replaced by None once per chunk.
+"""
+import re
+from decimal import Decimal, InvalidOperation
+
+import numpy
+import pandas
+from six import string_types
+
+
+# Kinds of columns by the internal type of the model field
+KINDS = {
+    'CharField': 'string',
+    'TextField': 'string',
+    'SlugField': 'string',
+    'EmailField': 'string',
+    'URLField': 'string',
+    'IntegerField': 'integer',
+    'BigIntegerField': 'integer',
+    'SmallIntegerField': 'integer',
+    'PositiveIntegerField': 'integer',
+    'PositiveSmallIntegerField': 'integer',
+    'PositiveBigIntegerField': 'integer',
+    'AutoField': 'integer',
+    'BigAutoField': 'integer',
+    'SmallAutoField': 'integer',
+    'FloatField': 'float',
+    'DecimalField': 'decimal',
+    'DateField': 'date',
+    'DateTimeField': 'datetime',
+}
+
+# Reflections passing the column value to the field as is
+TYPED_REFLECTIONS = ['direct', 'update', 'clean']
+
+# Formats whose reading functions accept the `dtype` parameter
+PARSER_FORMATS = ['csv', 'table', 'fwf', 'excel']
+
+# Kinds of columns read as strings by the parser
+PARSER_STRINGS = ['string', 'decimal']
+
+INTEGER = re.compile(r'^\s*[+-]?\d+\s*$')
+
+# ISO formats of dates and datetimes accepted by Django, and the UTC offset of the datetime
+DATE = r'^\s*\d{4}-\d{1,2}-\d{1,2}\s*$'
+DATETIME = r'^\s*\d{4}-\d{1,2}-\d{1,2}([T ]\d{1,2}:\d{1,2}(:\d{1,2}(\.\d{1,6})?)?\s*(Z|[+-]\d{2}(:?\d{2})?)?)?\s*$'
+OFFSET = r':\d{2}(?:\.\d+)?\s*(?:Z|[+-]\d{2}(?::?\d{2})?)\s*$'
+
+
+def field_kinds(plan):
+    """
+    Returns kinds of source columns by the column name, for columns reflected to model fields as is
+    """
+    kinds = {}
+    conflicts = set()
+    for step in plan.steps:
+        if step.name not in TYPED_REFLECTIONS or not step.columns:
+            continue
+        try:
+            field = plan.model._meta.get_field(step.field_name)
+        except Exception:
+            continue
+        if field.is_relation:
+            continue
+        kind = KINDS.get(field.get_internal_type())
+        column = step.columns[0]
+        if not kind or kinds.get(column, kind) != kind:
+            conflicts.add(column)
+        kinds[column] = kind
+    return dict((column, kind) for column, kind in kinds.items() if column not in conflicts)
+
+
+def parser_dtypes(format, kinds):
+    """
+    Returns the `dtype` parameter of the reading function, or None if the format does not support it
+    """
+    if format not in PARSER_FORMATS:
+        return None
+    dtypes = dict((column, str) for column, kind in kinds.items() if kind in PARSER_STRINGS)
+    return dtypes or None
+
+
+def _nulls(values):
+    """Internal helper returning values having missing ones replaced by None"""
+    return values.astype(object).where(values.notna(), None)
+
+
+def _objects(values, converted, valid):
+    """Internal helper returning values having valid ones replaced by converted, and missing ones by None"""
+    result = values.to_numpy(dtype=object, copy=True)
+    valid = valid.to_numpy()
+    result[valid] = converted[valid]
+    result[values.isna().to_numpy()] = None
+    return pandas.Series(result, index=values.index, dtype=object)
+
+
+def _integer(value):
+    """Internal helper converting the value to int exactly, returns the value as is if not possible"""
+    if isinstance(value, float):
+        return int(value) if value.is_integer() else value
+    if isinstance(value, string_types) and INTEGER.match(value):
+        return int(value)
+    return value
+
+
+def convert_integer(values):
+    if values.dtype.kind in 'iu':
+        return values
+    result = numpy.empty(len(values.index), dtype=object)
+    result[:] = [_integer(value) for value in values.to_numpy(dtype=object)]
+    result[values.isna().to_numpy()] = None
+    return pandas.Series(result, index=values.index, dtype=object)
+
+
+def convert_float(values):
+    if values.dtype.kind == 'f':
+        return values
+    numbers = pandas.to_numeric(values, errors='coerce')
+    return _objects(values, numbers.to_numpy().astype('float64').astype(object), numbers.notna())
+
+
+def _decimal(value):
+    """Internal helper converting the value to Decimal, returns the value as is if not possible"""
+    try:
+        return Decimal(str(value).strip())
+    except (InvalidOperation, ValueError):
+        return value
+
+
+def convert_decimal(values):
+    return _nulls(values.map(_decimal, na_action='ignore'))
+
+
+def _timestamps(values, pattern, convert):
+    """
+    Internal helper converting values matching the ISO pattern by the `convert` function of parsed timestamps,
+    values having the UTC offset are converted to UTC, other values are left as is
+    """
+    if values.dtype.kind == 'M':
+        return _objects(values, convert(values), values.notna())
+    text = values.astype(str)
+    matched = (values.notna() & text.str.match(pattern)).to_numpy()
+    aware = matched & text.str.contains(OFFSET).to_numpy()
+    result = values.to_numpy(dtype=object, copy=True)
+    for mask, utc in ((matched & ~aware, False), (aware, True)):
+        if not mask.any():
+            continue
+        try:
+            dates = pandas.to_datetime(text[mask], errors='coerce', utc=utc)
+        except (ValueError, TypeError, OverflowError):
+            continue
+        valid = dates.notna().to_numpy()
+        result[numpy.flatnonzero(mask)[valid]] = convert(dates[valid])
+    result[values.isna().to_numpy()] = None
+    return pandas.Series(result, index=values.index, dtype=object)
+
+
+def convert_date(values):
+    return _timestamps(values, DATE, lambda dates: dates.dt.date.to_numpy(dtype=object))
+
+
+def convert_datetime(values):
+    return _timestamps(values, DATETIME, lambda dates: dates.dt.to_pydatetime())
+
+
+CONVERTERS = {
+    'integer': convert_integer,
+    'float': convert_float,
+    'decimal': convert_decimal,
+    'date': convert_date,
+    'datetime': convert_datetime,
+}
+
+
+def convert_dataset(dataset, kinds):
+    """
+    Returns the dataset having columns converted to their kinds, and missing values replaced by None
+    """
+    missing = dataset.isna().any().to_numpy()
+    columns = []
+    changed = False
+    for position, column in enumerate(dataset.columns):
+        values = dataset.iloc[:, position]
+        converter = CONVERTERS.get(kinds.get(column))
+        converted = converter(values) if converter else values
+        if missing[position] and converted is values:
+            converted = _nulls(values)
+        changed = changed or converted is not values
+        columns.append(converted)
+    if not changed:
+        return dataset
+    result = pandas.concat(columns, axis=1, ignore_index=True)
+    result.columns = dataset.columns
+    return result
+
+
+def convert_chunks(chunks, kinds):
+    """
+    Yields all chunks converted by the `convert_dataset()`
+    """
+    for dataset in chunks:
+        yield convert_dataset(dataset, kinds)
@@ -1,9 +1,13 @@
-from functools import partial
+import threading
+import zipfile
+from collections import deque
 
 import pandas
-from six import string_types
 
-from django.db import DatabaseError, transaction
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files import File
+from django.db import connections, router
+from django.utils import timezone
 
 
 try:
@@ -11,18 +15,43 @@ try:
 except ImportError:
     from django.utils.translation import gettext_lazy as _
 
-from . import reflections as reflect
+from .archives import MemberLog, archive_members, compression, decompress
+from .changes import ChangeDetector
 from .config import get_options
+from .dtypes import convert_chunks, field_kinds, parser_dtypes
+from .parallel import WriterPool
+from .plan import ImportPlan
+from .profiling import Profiler
+from .readers import (
+    PROJECTIONS,
+    LocalFile,
+    get_engines,
+    get_reader,
+    iterate_dataset,
+    local_path,
+    read_chunks,
+    spool,
+)
 from .reflector import Reflector
+from .rejects import RejectWriter, reject_format
+from .validation import ReflectionError, Validator
+from .writers import reject_row, write_batch, write_rows
 
 
-def run_import(import_log_id=None):
+class ImportAborted(Exception):
+    """
+    Raised when the import should not be continued, because the `aborted` event of the log has been set
+    """
+
+
+def run_import(import_log_id=None, aborted=None):
     """
     Evaluates importing process just after the ImportJob instance has been saved.
 
     It may be evaluated synchronously in the context of the WEB Application,
     or asynchronously in the context of the Celery Worker,
     depending on `async` option of the `DJANGO_IMPORT` variable in the settings file.
+    If the `aborted` event is passed, the import is interrupted when it is set, and the log is not finished.
     """
     from django_import.models import ImportLog
 
@@ -30,109 +59,617 @@ def run_import(import_log_id=None):
     if not log:
         return
 
+    log.aborted = aborted
     job = log.job
     log.info(_('Trying to import %s'), job.upload_file)
+    log.progress(started_at=timezone.now())
+    log.stage('prepare')
 
     try:
         try_import(log)
+    except ImportAborted as ex:
+        return abort_import(log, ex)
     except Exception as ex:
         log.error(_('Unexpected error: %s'), ex)
     log.finish()
 
 
-def try_import(log):
+def resume_import(import_log_id=None, aborted=None):
+    """
+    Resumes the interrupted, or failed importing process from the last checkpoint.
+
+    Rows before the checkpoint are read from the file and dropped without reflecting and storing them,
+    the rest of rows is imported using options of the interrupted import, and counters are continued.
+    """
+    from django_import.models import ImportLog
+
+    log = ImportLog.objects.filter(id=import_log_id).last()
+    if not log:
+        return
+
+    log.aborted = aborted
+    job = log.job
+    log.progress(is_finished=False, finished_at=None)
+    log.info(_('Resuming import of %s from the row %s'), job.upload_file, log.checkpoint or 0)
+    if not log.started_at:
+        log.progress(started_at=timezone.now())
+    log.stage('prepare')
+
+    try:
+        try_import(log, log.checkpoint or 0)
+    except ImportAborted as ex:
+        return abort_import(log, ex)
+    except Exception as ex:
+        log.error(_('Unexpected error: %s'), ex)
+    log.finish()
+
+
+def abort_import(log, reason):
+    """
+    Stops the aborted import without finishing the log, which may be continued by another process
+    """
+    log.row = None
+    log.warning(_('Import has been aborted before the row %s'), reason)
+    log.flush()
+
+
+def map_headers(log, dataset, headers, first=True):
+    """
+    Replaces headers of the dataset by the `headers` option if set,
+    or by sequential numbers if headers have not been recognized.
+    """
+    if headers:
+        dataset = dataset.rename(columns=dict(zip([a for a in dataset.columns], headers)))
+    if isinstance(dataset.columns, pandas.core.indexes.numeric.Int64Index):
+        dataset = dataset.rename(columns=dict(zip([a for a in dataset.columns], ['%04d' % (a + 1) for a in dataset.columns])))
+        if first:
+            log.info(_('Headers not found, replacing by sequential numbers: %s'), ', '.join(dataset.columns))
+    return dataset
+
+
+def _tell(file):
+    """Internal helper returning the current position of the file, or None if unknown"""
+    try:
+        return file.tell()
+    except Exception:
+        return None
+
+
+def iterate_chunks(log, file, chunks, headers, chunk_size, skip=0, profiler=None):
+    """
+    Yields all chunks read from the file with headers replaced if necessary,
+    and indexed by sequential row numbers in the file.
+
+    The first `skip` rows are dropped.
+    If the whole file is read as several chunks, like sheets of the workbook, the total number of rows is summed up.
+    """
+    profiler = profiler or Profiler()
+    offset = 0
+    sheet = None
+    for number, dataset in enumerate(chunks):
+        log.progress(current_chunk=number + 1, bytes_read=_tell(file))
+        # DataFrame attributes are available since pandas 1.0
+        if getattr(dataset, 'attrs', {}).get('sheet', sheet) != sheet:
+            sheet = dataset.attrs['sheet']
+            log.info(_('Reading the sheet: %s'), sheet)
+        if number and not chunk_size:
+            log.progress(rows_total=(log.rows_total or 0) + len(dataset.index))
+        if not number:
+            log.stage('import')
+            if chunk_size:
+                log.info(
+                    _('Import file has been recognized, %s columns, reading by chunks of %s rows: %s'),
+                    len(dataset.columns), chunk_size, file
+                )
+            else:
+                log.info(
+                    _('Import file has been recognized, %s columns, %s rows: %s'),
+                    len(dataset.columns), len(dataset.index), file
+                )
+                log.progress(rows_total=len(dataset.index))
+        start, offset = offset, offset + len(dataset.index)
+        if offset <= skip:
+            continue
+        with profiler.stage('headers'):
+            dataset = map_headers(log, dataset, headers, first=not number)
+        dataset.index = pandas.RangeIndex(start, offset)
+        if skip > start:
+            dataset = dataset.iloc[skip - start:]
+        yield dataset
+
+
+def reflect_rows(log, plan, reflector, chunks, profiler=None):
+    """
+    Reflects all chunks row by row.
+
+    Yields index, data `Row` view, create and update dictionaries, and the reflection error if happens,
+    for every row.
+
+    Every chunk is released as soon as all its rows have been processed.
+    Reflections having the prefetching version, like `lookup`, prefetch values of the whole chunk before rows.
+    """
+    profiler = profiler or Profiler()
+    for dataset in chunks:
+        for step in plan.steps:
+            if not step.prefetch:
+                continue
+            try:
+                with profiler.reflection(step.field_name):
+                    step.prefetch(reflector, plan.model, step.field_name, dataset, log)
+            except Exception as ex:
+                log.debug(_('Prefetching for %s failed, reflecting row by row: %s'), step.field_name, ex)
+        for ind, data in iterate_dataset(dataset):
+            create, update = {}, {}
+            try:
+                for step in plan.steps:
+                    with profiler.reflection(step.field_name):
+                        c, u = step.function(reflector, plan.model, step.field_name, data, log)
+                    create.update(c)
+                    update.update(u)
+            except Exception as ex:
+                yield ind, data, None, None, ReflectionError(step.field_name, ex)
+                continue
+            yield ind, data, create, update, None
+
+
+def reflect_column(log, model, step, reflector, dataset, errors):
+    """
+    Reflects the field for the whole chunk, using the vectorized reflection if present.
+
+    Returns create and update dictionaries of values for every row index.
+    If the vectorized reflection is absent or fails, the field is reflected row by row,
+    and errors are collected to the `errors` dictionary by the row index.
+    """
+    if step.vectorized:
+        try:
+            c, u = step.vectorized(reflector, model, step.field_name, dataset, log)
+            return (
+                dict((k, v.to_dict()) for k, v in c.items()),
+                dict((k, v.to_dict()) for k, v in u.items()),
+            )
+        except Exception as ex:
+            log.debug(_('Vectorized reflection for %s failed, reflecting row by row: %s'), step.field_name, ex)
+    create, update = {}, {}
+    for ind, data in iterate_dataset(dataset):
+        if ind in errors:
+            continue
+        try:
+            c, u = step.function(reflector, model, step.field_name, data, log)
+        except Exception as ex:
+            errors[ind] = ReflectionError(step.field_name, ex)
+            continue
+        for k in c:
+            create.setdefault(k, {})[ind] = c[k]
+        for k in u:
+            update.setdefault(k, {})[ind] = u[k]
+    return create, update
+
+
+def reflect_columns(log, plan, reflector, chunks, profiler=None):
+    """
+    Reflects all chunks column by column, using vectorized reflections where possible.
+
+    Yields the same values as the `reflect_rows()`.
+    """
+    profiler = profiler or Profiler()
+    for dataset in chunks:
+        columns = []
+        errors = {}
+        for step in plan.steps:
+            with profiler.reflection(step.field_name):
+                columns.append(reflect_column(log, plan.model, step, reflector, dataset, errors))
+        for ind, data in iterate_dataset(dataset):
+            if ind in errors:
+                yield ind, data, None, None, errors[ind]
+                continue
+            create, update = {}, {}
+            for c, u in columns:
+                for k in c:
+                    if ind in c[k]:
+                        create[k] = c[k][ind]
+                for k in u:
+                    if ind in u[k]:
+                        update[k] = u[k][ind]
+            yield ind, data, create, update, None
+
+
+def source_columns(log, plan, format, headers, parameters, columns=True):
+    """
+    Returns a list of source columns to be read, or None if all columns should be read.
+
+    The `columns` option switches off reading of selected columns if false,
+    or lists additional columns to be read, if reflections using the whole row are present.
+    Columns are not selected if headers are replaced, or selected by parameters of the reading function.
+    """
+    if not columns or format not in PROJECTIONS:
+        return None
+    if headers or ('header' in parameters and parameters['header'] is None):
+        return None
+    if set(parameters).intersection(['usecols', 'columns', 'index_col']):
+        return None
+    selected = plan.source_columns(columns if isinstance(columns, list) else None)
+    if selected is None:
+        log.info(_('Some reflections may use the whole row, all columns are read'))
+    else:
+        log.info(_('Only columns used by reflections are read: %s'), ', '.join('%s' % c for c in selected))
+    return selected
+
+
+def column_kinds(log, plan, format, headers, parameters):
+    """
+    Returns kinds of source columns derived from model fields, and sets the `dtype` parameter
+    of the reading function to read text and decimal columns as strings.
+
+    The parameter is not set if headers are replaced, or the `dtype` parameter is set explicitly.
+    """
+    kinds = field_kinds(plan)
+    if kinds:
+        log.info(_('Column types derived from the model: %s'), ', '.join('%s: %s' % item for item in sorted(kinds.items())))
+    if headers or ('header' in parameters and parameters['header'] is None) or 'dtype' in parameters:
+        return kinds
+    dtype = parser_dtypes(format, kinds)
+    if dtype:
+        parameters['dtype'] = dtype
+    return kinds
+
+
+def try_import(log, skip=0):
+    """
+    Imports the upload file of the log job, using options of the log
+    """
     job = log.job
-    format_parameters = job.options.get('parameters', {})
-    format = job.options.get('format', 'csv')
-    mode = job.options.get('mode', 'rb')
-    headers = job.options.get('headers', None)
-    reflections = job.options.get('reflections', {})
-    identity = job.options.get('identity', [])
+    return import_file(log, job.model.model_class(), job.upload_file, log.options or job.options, skip)
+
+
+def _size(file):
+    """Internal helper returning the size of the file, or None if unknown"""
+    try:
+        return file.size
+    except Exception:
+        return None
+
+
+def import_file(log, model, file, options, skip=0):
+    """
+    Imports the file to the model using options, returns a number of successfully imported rows.
+
+    The file is opened if closed, and closed when the import is finished, the file already opened is read as is.
+    Compressed files are decompressed on the fly, and members of zip archives are imported by `import_archive()`.
+    """
+    format_parameters = options.get('parameters', {})
+    format = options.get('format', 'csv')
+    engine = options.get('engine', None)
+    mode = options.get('mode', 'rb')
+    headers = options.get('headers', None)
+    reflections = options.get('reflections', {})
+    identity = options.get('identity', [])
+    batch_size = options.get('batch_size', None)
+    bulk = options.get('bulk', True)
+    chunk_size = options.get('chunk_size', None)
+    vectorize = options.get('vectorize', False)
+    rejects = options.get('rejects', False)
+    dry_run = options.get('dry_run', False)
+    skip_unchanged = options.get('skip_unchanged', False)
+    workers = options.get('workers', None)
+    local = options.get('local', True)
+    columns = options.get('columns', True)
+    dtypes = options.get('dtypes', True)
+    sheets = options.get('sheets', None)
+    profiler = Profiler(options.get('profile', False))
     # TODO: file encoding? data encoding? leave as-is a while ...
     if mode not in ['rb', 'rt']:
         log.warning(_('Mode should be either rb (read binary), or rt (read text), got %s, ignored'), mode)
         mode = 'rb'
+    compressed = compression(file.name, options.get('compression', 'infer'))
+    if compressed == 'zip':
+        return import_archive(log, model, file, options)
 
-    read_function = getattr(pandas, 'read_%s' % format, None)
+    read_function = get_reader(format)
     if not read_function:
         log.warning(_('Read function not found, finished: read_%s'), format)
+        return 0
 
     params = {}
     params.update(**format_parameters)
+    chunk_size = params.pop('chunksize', chunk_size)
+    if sheets is not None:
+        if format == 'excel':
+            params['sheets'] = sheets
+        else:
+            log.warning(_('Sheets may be read only from workbooks, ignored'))
 
-    job.upload_file.open(mode)
     try:
-        dataset = read_function(job.upload_file, **format_parameters)
-    except Exception:
-        job.upload_file.close()
-        raise
-    job.upload_file.close()
-    log.info(
-        _('Import file has been recognized, %s columns, %s rows: %s'),
-        len(dataset.columns), len(dataset.index), job.upload_file
-    )
-    if headers:
-        dataset = dataset.rename(columns=dict(zip([a for a in dataset.columns], headers)))
-    if isinstance(dataset.columns, pandas.core.indexes.numeric.Int64Index):
-        dataset = dataset.rename(columns=dict(zip([a for a in dataset.columns], ['%04d' % (a + 1) for a in dataset.columns])))
-        log.info(_('Headers not found, replacing by sequential numbers: %s'), ', '.join(dataset.columns))
-    model = job.model.model_class()
-    convertors = {}
-    reflector = Reflector()
-    for f_name in set(reflections.keys()).union(f.name for f in model._meta.fields):
-        reflection = reflections.get(f_name, 'direct')
-        if isinstance(reflection, string_types):
-            reflection = {
-                'function': reflection
-            }
-        if not isinstance(reflection, dict):
-            log.warning(_("The reflection is not formatted properly: %s"), reflection)
-            continue
-        reflection_function = getattr(reflect, 'reflection_%s' % reflection['function'], None)
-        if not reflection_function:
-            log.warning(_('Reflection function %s has not been registered, ignored'), reflection['function'])
-            continue
-        convertors[f_name] = {
-            'function': reflection_function,
-            'parameters': reflection.get('parameters', {})
-        }
-    cnt = 0
-    skipped = 0
+        plan = ImportPlan(model, reflections)
+    except ImproperlyConfigured as ex:
+        log.error(_('Import options are not valid, finished: %s'), ex)
+        return 0
+    reflector = Reflector(options.get('lookup_cache_size', None))
+    # rows written to the rejects file keep all source columns
+    columns = source_columns(log, plan, format, headers, params, False if rejects else columns)
+    kinds = column_kinds(log, plan, format, headers, params) if dtypes else None
+    if rejects:
+        rejects = RejectWriter(log, *reject_format(log, rejects, format, params))
+    if workers and workers > 1 and (not batch_size or dry_run):
+        log.warning(_('Rows are stored by concurrent workers only in batches, and not in the dry run, workers ignored'))
+        workers = None
+    connection = connections[router.db_for_write(model)]
+    if workers and workers > 1 and connection.vendor == 'sqlite':
+        log.warning(_('The database does not support concurrent writes, workers ignored'))
+        workers = None
+    log.stage('read')
+    # compressed files are decompressed from the binary file
+    file_mode = 'rb' if compressed else mode
+    opened = file.closed
+    if opened:
+        file.open(file_mode)
+    log.progress(bytes_total=_size(file))
+    validator = Validator(model) if dry_run else None
+    detector = None
+    if skip_unchanged and not dry_run:
+        if identity:
+            detector = ChangeDetector(model, identity, options)
+        else:
+            log.warning(_('Unchanged rows can be detected only using the identity, all rows are stored'))
+    source, spooled, raw = file, None, None
+    try:
+        with profiler.connect(connection):
+            if local:
+                path = local_path(file)
+                if not path and getattr(file, 'storage', None) is not None:
+                    with profiler.stage('spool'):
+                        spooled = spool(file, file_mode)
+                    path = spooled.name
+                    log.info(_('File has been copied from the storage to the local file: %s'), path)
+                if path:
+                    source = LocalFile(path)
+            # the position is reported in the compressed file
+            origin = source
+            if compressed:
+                if isinstance(source, LocalFile):
+                    origin = raw = File(open(source.path, 'rb'), name=source.path)
+                try:
+                    source = decompress(origin, compressed, mode, params.get('encoding'))
+                except (ImportError, ValueError) as ex:
+                    log.error(_('Compression %s is not supported, finished: %s'), compressed, ex)
+                    return 0
+                log.info(_('File is decompressed on the fly: %s'), compressed)
+            chunks = read_chunks(log, source, format, read_function, params, chunk_size, get_engines(format, engine), columns)
+            chunks = profiler.timed(iterate_chunks(log, origin, chunks, headers, chunk_size, skip, profiler), 'read')
+            # rejected rows are written with source values, not converted yet
+            if rejects:
+                chunks = rejects.track(chunks)
+            if kinds is not None:
+                chunks = profiler.timed(convert_chunks(chunks, kinds), 'convert')
+            if vectorize:
+                rows = reflect_columns(log, plan, reflector, chunks, profiler)
+            else:
+                rows = reflect_rows(log, plan, reflector, chunks, profiler)
+            rows = profiler.timed(rows, 'reflect')
+            cnt = import_rows(log, model, identity, batch_size, bulk, rows, rejects, validator, detector, workers, profiler)
+    finally:
+        if raw:
+            raw.close()
+        if spooled:
+            spooled.close()
+        if opened:
+            file.close()
+        if rejects:
+            rejects.close(file.name)
+    if reflector.lookups.hits or reflector.lookups.misses:
+        log.info(_('Lookup cache: %s hits, %s misses'), reflector.lookups.hits, reflector.lookups.misses)
+    profiler.report(log)
+    if validator:
+        validator.report(log, log.rows_read, profiler.totals())
+        log.info(_('Dry run has been finished, %s rows are valid, nothing has been stored'), cnt)
+        return cnt
+    log.info(_('Import has been finished, %s rows successfully imported'), cnt)
+    return cnt
+
+
+def import_archive(log, model, file, options):
+    """
+    Imports members of the zip archive matching the `members` option using the same options,
+    returns a number of successfully imported rows.
+
+    Members are decompressed on the fly, and imported one by one, or concurrently by `member_workers` threads.
+    Every member is imported using the `MemberLog`, keeping its progress counters in the `members` attribute of the log.
+    Members already imported are skipped when the import is resumed, others are resumed from their checkpoints.
+    """
+    patterns = options.get('members', None)
+    workers = options.get('member_workers', None)
+    member_options = dict(options, local=False, compression='infer')
+    if options.get('rejects', False):
+        log.warning(_('Rejected rows of archive members are logged, the rejects file is not written'))
+        member_options['rejects'] = False
+    if workers and workers > 1 and connections[router.db_for_write(model)].vendor == 'sqlite':
+        log.warning(_('The database does not support concurrent writes, member workers ignored'))
+        workers = None
+    log.stage('read')
+    opened = file.closed
+    if opened:
+        file.open('rb')
+    source, spooled = file, None
+    try:
+        if options.get('local', True):
+            path = local_path(file)
+            if not path and getattr(file, 'storage', None) is not None:
+                spooled = spool(file, 'rb')
+                path = spooled.name
+                log.info(_('File has been copied from the storage to the local file: %s'), path)
+            if path:
+                source = path
+        with zipfile.ZipFile(source) as archive:
+            members = archive_members(archive, patterns)
+            if not members:
+                log.warning(_('No archive members found, finished'))
+                return 0
+            log.info(_('Archive members to be imported: %s'), ', '.join(info.filename for info in members))
+            log.progress(bytes_total=sum(info.file_size for info in members))
+            lock = threading.RLock()
+
+            def member_import(info):
+                member_log = MemberLog(log, info.filename, lock)
+                if member_log.is_finished:
+                    member_log.info(_('Member has been imported already, skipped'))
+                    return member_log.rows_imported or 0
+                member = File(archive.open(info), name=info.filename)
+                member.size = info.file_size
+                try:
+                    cnt = import_file(member_log, model, member, member_options, member_log.checkpoint or 0)
+                except ImportAborted:
+                    raise
+                except Exception as ex:
+                    member_log.error(_('Unexpected error: %s'), ex)
+                    return 0
+                finally:
+                    member.close()
+                member_log.progress(is_finished=True)
+                return cnt
+
+            if workers and workers > 1:
+                pool = WriterPool(workers)
+                try:
+                    results = [future.result() for future in [pool.submit(member_import, info) for info in members]]
+                finally:
+                    pool.close()
+            else:
+                results = [member_import(info) for info in members]
+    finally:
+        if spooled:
+            spooled.close()
+        if opened:
+            file.close()
+    cnt = sum(results)
+    log.info(_('Archive has been imported, %s members, %s rows successfully imported'), len(members), cnt)
+    return cnt
+
+
+COUNTERS = ('rows_read', 'rows_imported', 'rows_skipped', 'rows_unchanged', 'rows_errored', 'checkpoint')
+
+
+def import_rows(log, model, identity, batch_size, bulk, rows, rejects=None, validator=None, detector=None, workers=None,
+                profiler=None):
+    """
+    Writes all reflected rows, returns a number of successfully imported rows.
+
+    Progress counters and the checkpoint of the log are updated every time when the row, or the batch
+    has been stored, and every `rows_report` rows read meanwhile, and continued if the import is resumed.
+    If the `rejects` writer is passed, failed rows are written there instead of the log.
+    If the `validator` is passed, rows are validated instead of writing, and the number of valid rows is returned.
+    If the change `detector` is passed, rows not changed since the last import are not written.
+    If a number of `workers` is passed, batches are stored concurrently by the pool of threads,
+    while results are counted, and the checkpoint is updated in order of batches.
+    If the `profiler` is passed, storing rows is measured as the `write` stage, or `validate` in the dry run,
+    and waiting for concurrent workers as the `wait` stage.
+    Raises `ImportAborted` before the next row is written, if the `aborted` event of the log has been set.
+    """
+    profiler = profiler or Profiler()
+    aborted = getattr(log, 'aborted', None)
+    connection_alias = router.db_for_write(model)
+    counters = dict((k, getattr(log, k) or 0) for k in COUNTERS)
     rows_report = get_options()['rows_report']
-    for ind, data in [(row[0], dict(zip(dataset.columns, row[1]))) for row in dataset.iterrows()]:
-        create, update = {}, {}
-        try:
-            for field_name in convertors:
-                f = partial(convertors[field_name]['function'], **convertors[field_name]['parameters'])
-                c, u = f(reflector, model, field_name, data, log)
-                create.update(c)
-                update.update(u)
-        except Exception as ex:
-            log.warning(_("Error while importing data: %s"), ex)
-            continue
-        if not create and not update:
-            if not cnt and skipped >= 2:
-                log.warning(_("%s rows at the top have no reflected data, import interrupted"), skipped + 1)
-                break
+    batch, sources, digests = [], {}, {}
+    pool = WriterPool(workers) if workers and workers > 1 else None
+    pending = deque()
+
+    def store(batch, digests, rejected):
+        with profiler.connect(connections[connection_alias]), profiler.stage('validate' if validator else 'write'):
+            return persist(batch, digests, rejected)
+
+    def persist(batch, digests, rejected):
+        unchanged = 0
+        if detector:
+            size, batch = len(batch), detector.changed(batch, digests)
+            unchanged = size - len(batch)
+        if validator:
+            written = validator.validate_batch(log, batch, rejected)
+        elif batch_size:
+            written = write_batch(log, model, identity, batch, bulk, rejected)
+        else:
+            written = write_rows(log, model, identity, batch, rejected)
+        if detector:
+            failed = set(item[0] for item, ex in rejected)
+            detector.store([item for item in batch if item[0] not in failed], digests)
+        return len(batch), written, unchanged
+
+    def account(result, sources, rejected, checkpoint):
+        size, written, unchanged = result
+        for item, ex in rejected or []:
+            if rejects:
+                rejects.reject(item[0], sources[item[0]], ex)
             else:
-                log.warning(_("No any reflected data found, row skipped: %s"), ', '.join(['%s:%r' % (k, v) for k, v in data.items()]))
-                skipped += 1
+                reject_row(log, item, ex)
+        if rejects:
+            rejects.write()
+        imported = counters['rows_imported']
+        counters['rows_imported'] += written
+        counters['rows_errored'] += size - written
+        counters['rows_unchanged'] += unchanged
+        counters['checkpoint'] = checkpoint
+        if counters['rows_imported'] // rows_report > imported // rows_report:
+            log.info(_('... %s rows successfully imported ...'), counters['rows_imported'])
+        log.progress(**counters)
+
+    def drain():
+        future, sources, rejected, checkpoint = pending.popleft()
+        with profiler.stage('wait'):
+            result = future.result()
+        account(result, sources, rejected, checkpoint)
+
+    def write(batch, sources, digests, checkpoint):
+        rejected = [] if rejects or detector or pool else None
+        if not pool:
+            account(store(batch, digests, rejected), sources, rejected, checkpoint)
+            return
+        pending.append((pool.submit(store, batch, digests, rejected), sources, rejected, checkpoint))
+        while len(pending) > pool.workers:
+            drain()
+
+    try:
+        for ind, data, create, update, error in rows:
+            if aborted is not None and aborted.is_set():
+                raise ImportAborted(ind)
+            log.row = ind
+            if not batch and not pending:
+                counters['checkpoint'] = ind
+                if counters['rows_read'] and counters['rows_read'] % rows_report == 0:
+                    log.progress(**counters)
+            counters['rows_read'] += 1
+            if error is not None:
+                if validator:
+                    validator.count(error)
+                if rejects:
+                    rejects.reject(ind, rejects.source(data), error)
+                else:
+                    log.warning(_("Error while importing data: %s"), error)
+                counters['rows_errored'] += 1
                 continue
-        try:
-            with transaction.atomic():
-                ident = dict([(k, v) for k, v in create.items() if k in identity])
-                if ident:
-                    instance, created = model.objects.update_or_create(defaults=create, **ident)
+            if not create and not update:
+                if not counters['rows_imported'] and not batch and not pending and counters['rows_skipped'] >= 2:
+                    log.warning(_("%s rows at the top have no reflected data, import interrupted"), counters['rows_skipped'] + 1)
+                    break
                 else:
-                    instance = model.objects.create(**create)
-                if update:
-                    for k in update:
-                        setattr(instance, k, update[k])
-                    instance.save()
-        except DatabaseError as ex:
-            log.error(_("Database error while importing data: create %r, update %r, %s"), create, update, ex)
-            continue
-        cnt += 1
-        if cnt % rows_report == 0:
-            log.info(_('... %s rows successfully imported ...'), cnt)
-    log.info(_('Import has been finished, %s rows successfully imported'), cnt)
+                    log.warning(_("No any reflected data found, row skipped: %s"), ', '.join(['%s:%r' % (k, v) for k, v in data.items()]))
+                    counters['rows_skipped'] += 1
+                    continue
+            batch.append((ind, create, update))
+            if rejects:
+                sources[ind] = rejects.source(data)
+            if detector:
+                with profiler.stage('hash'):
+                    digest = detector.digest(create, update)
+                if digest:
+                    digests[ind] = digest
+            if len(batch) >= (batch_size or 1):
+                write(batch, sources, digests, ind + 1)
+                batch, sources, digests = [], {}, {}
+        log.row = None
+        if batch:
+            write(batch, sources, digests, batch[-1][0] + 1)
+        while pending:
+            drain()
+    finally:
+        if pool:
+            pool.close()
+    log.progress(**counters)
+    return counters['rows_imported']
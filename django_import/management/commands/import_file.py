@@ -0,0 +1,135 @@
+import json
+import os
+import sys
+import time
+
+from django.apps import apps
+from django.contrib.contenttypes.models import ContentType
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from django_import.import_task import import_file
+from django_import.models import ImportJob, ImportLog
+
+
+class Console(object):
+    """
+    Reports log entries and progress counters of the import to the terminal
+    """
+    def __init__(self, stdout, stderr, verbosity=1, interval=1.0):
+        self.stdout = stdout
+        self.stderr = stderr
+        self.verbosity = verbosity
+        self.interval = interval
+        self.reported = 0
+
+    def message(self, entry):
+        if entry.level <= 3 or self.verbosity > 1:
+            self.stderr.write('%s' % entry)
+
+    def progress(self, log, force=False):
+        if not self.verbosity or (not force and time.time() - self.reported < self.interval):
+            return
+        self.reported = time.time()
+        line = '%s rows read, %s imported, %s skipped, %s unchanged, %s errored' % (
+            log.rows_read, log.rows_imported, log.rows_skipped, log.rows_unchanged, log.rows_errored
+        )
+        if log.bytes_total and log.bytes_read:
+            line += ', %.1f%%' % (100.0 * log.bytes_read / log.bytes_total)
+        rows_per_second = log.rows_per_second()
+        if rows_per_second is not None:
+            line += ', %s rows/s' % rows_per_second
+        self.stdout.write(line)
+
+
+def storage_name(storage, path):
+    """
+    Returns the name of the local file relative to the location of the file system storage,
+    or None if the file is not located there
+    """
+    location = getattr(storage, 'location', None)
+    if not location:
+        return None
+    try:
+        name = os.path.relpath(os.path.realpath(path), os.path.realpath(location))
+    except ValueError:
+        return None
+    if name == os.pardir or name.startswith(os.pardir + os.sep):
+        return None
+    return name.replace(os.sep, '/')
+
+
+class Command(BaseCommand):
+    help = 'Imports the local file to the model, reading it directly from the disk'
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', help='Model label, like app_label.ModelName')
+        parser.add_argument('path', help='Path to the file to be imported, or - to read the standard input')
+        parser.add_argument('--options', help='Path to the JSON file containing import options')
+        parser.add_argument('--format', help='Format of the file, overrides the format option')
+        parser.add_argument('--batch-size', type=int, help='Overrides the batch_size option')
+        parser.add_argument('--chunk-size', type=int, help='Overrides the chunk_size option')
+        parser.add_argument('--workers', type=int, help='Overrides the workers option')
+        parser.add_argument(
+            '--no-job', action='store_true', default=False,
+            help='Do not create the import job, and do not copy the file located outside of the storage',
+        )
+
+    def handle(self, *av, **options):
+        try:
+            model = apps.get_model(options['model'])
+        except (LookupError, ValueError) as ex:
+            raise CommandError('Model not found: %s' % ex)
+        import_options = {}
+        if options['options']:
+            with open(options['options'], 'rt') as options_file:
+                import_options = json.load(options_file)
+        for name in ('format', 'batch_size', 'chunk_size', 'workers'):
+            if options[name] is not None:
+                import_options[name] = options[name]
+
+        path = options['path']
+        if path == '-' and not options['no_job']:
+            raise CommandError('The standard input may be read only using the --no-job option')
+        if path != '-' and not os.path.isfile(path):
+            raise CommandError('File not found: %s' % path)
+
+        console = Console(self.stdout, self.stderr, options['verbosity'])
+        if options['no_job']:
+            log = ImportLog(options=import_options)
+        else:
+            job = ImportJob(model=ContentType.objects.get_for_model(model), options=import_options)
+            # the file located in the storage is referred without copying
+            name = storage_name(job.upload_file.storage, path)
+            if name:
+                job.upload_file = name
+                job.save(start=False)
+            else:
+                with open(path, 'rb') as upload_file:
+                    job.upload_file = File(upload_file, name=os.path.basename(path))
+                    job.save(start=False)
+                self.stdout.write('File has been copied to the storage: %s' % job.upload_file.name)
+            log = ImportLog.objects.create(job=job, options=import_options, fingerprint=job.fingerprint)
+            self.stdout.write('Import log %s has been created for the job %s' % (log.id, job.id))
+        log.console = console
+        log.progress(started_at=timezone.now())
+        log.stage('prepare')
+
+        mode = 'rt' if import_options.get('mode', 'rb') == 'rt' else 'rb'
+        if path == '-':
+            source = File(sys.stdin if mode == 'rt' else getattr(sys.stdin, 'buffer', sys.stdin), name='stdin')
+        else:
+            source = File(open(path, mode), name=path)
+        try:
+            import_file(log, model, source, import_options)
+        finally:
+            if path != '-':
+                source.close()
+            log.finished_at = timezone.now()
+            if log.pk:
+                log.finish()
+            else:
+                log.stage()
+            console.progress(log, force=True)
+            self.stdout.write('Finished in %.1f seconds' % log.elapsed())
@@ -0,0 +1,50 @@
+import threading
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from django_import.worker import work, worker_name
+
+
+class Command(BaseCommand):
+    help = 'Processes imports queued in the database, when the `sync` setting is `queue`'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Number of imports processed concurrently',
+        )
+        parser.add_argument(
+            '--once', action='store_true', default=False,
+            help='Exit when the queue is empty',
+        )
+        parser.add_argument(
+            '--sleep', type=float, default=1.0,
+            help='Seconds to wait for new imports when the queue is empty',
+        )
+
+    def handle(self, *av, **options):
+        stop = threading.Event()
+        threads = [
+            threading.Thread(target=self.work, args=(worker_name(number), stop, options['once'], options['sleep']))
+            for number in range(max(options['workers'], 1))
+        ]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        self.stdout.write('%s import workers started' % len(threads))
+        try:
+            while any(thread.is_alive() for thread in threads):
+                for thread in threads:
+                    thread.join(0.5)
+        except KeyboardInterrupt:
+            self.stdout.write('Stopping import workers, waiting for current imports to be finished')
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+    def work(self, name, stop, once, sleep):
+        try:
+            work(name, stop, once, sleep)
+        finally:
+            connection.close()
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.30 on 2026-10-17 03:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_import', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportLogEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Created At')),
+                ('level', models.PositiveSmallIntegerField(verbose_name='Level')),
+                ('chapter', models.CharField(max_length=16, verbose_name='Chapter')),
+                ('row', models.BigIntegerField(blank=True, help_text='Number of the data row processed when the entry has been written', null=True, verbose_name='Row')),
+                ('message', models.TextField(verbose_name='Message')),
+                ('log', models.ForeignKey(help_text='Log to which the entry is related', on_delete=django.db.models.deletion.CASCADE, related_name='entries', to='django_import.importlog', verbose_name='Log')),
+            ],
+            options={
+                'verbose_name': 'Import Log Entry',
+                'verbose_name_plural': 'Import Log Entries',
+                'ordering': ['id'],
+            },
+        ),
+    ]
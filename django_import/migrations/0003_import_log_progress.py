@@ -0,0 +1,69 @@
+# Generated by Django 4.2.30 on 2026-10-17 03:10
+
+from django.db import migrations, models
+import jsoneditor.fields.django_extensions_jsonfield
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_import', '0002_import_log_entry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importlog',
+            name='bytes_read',
+            field=models.BigIntegerField(blank=True, editable=False, null=True, verbose_name='Bytes Read'),
+        ),
+        migrations.AddField(
+            model_name='importlog',
+            name='bytes_total',
+            field=models.BigIntegerField(blank=True, editable=False, null=True, verbose_name='Bytes Total'),
+        ),
+        migrations.AddField(
+            model_name='importlog',
+            name='current_chunk',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Current Chunk'),
+        ),
+        migrations.AddField(
+            model_name='importlog',
+            name='finished_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Finished At'),
+        ),
+        migrations.AddField(
+            model_name='importlog',
+            name='rows_errored',
+            field=models.BigIntegerField(default=0, editable=False, help_text='Number of rows failed while reflecting or storing', verbose_name='Rows Errored'),
+        ),
+        migrations.AddField(
+            model_name='importlog',
+            name='rows_imported',
+            field=models.BigIntegerField(default=0, editable=False, verbose_name='Rows Imported'),
+        ),
+        migrations.AddField(
+            model_name='importlog',
+            name='rows_read',
+            field=models.BigIntegerField(default=0, editable=False, verbose_name='Rows Read'),
+        ),
+        migrations.AddField(
+            model_name='importlog',
+            name='rows_skipped',
+            field=models.BigIntegerField(default=0, editable=False, help_text='Number of rows having no reflected data', verbose_name='Rows Skipped'),
+        ),
+        migrations.AddField(
+            model_name='importlog',
+            name='rows_total',
+            field=models.BigIntegerField(blank=True, editable=False, help_text='Number of rows in the file if known', null=True, verbose_name='Rows Total'),
+        ),
+        migrations.AddField(
+            model_name='importlog',
+            name='stages',
+            field=jsoneditor.fields.django_extensions_jsonfield.JSONField(blank=True, default=dict, editable=False, help_text='Start and finish timestamps of every import stage', verbose_name='Stages'),
+        ),
+        migrations.AddField(
+            model_name='importlog',
+            name='started_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Started At'),
+        ),
+    ]
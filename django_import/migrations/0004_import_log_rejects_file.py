@@ -0,0 +1,19 @@
+# Generated by Django 4.2.30 on 2026-10-17 03:12
+
+import django.core.files.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_import', '0003_import_log_progress'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importlog',
+            name='rejects_file',
+            field=models.FileField(blank=True, editable=False, help_text='File containing rows rejected while importing', storage=django.core.files.storage.FileSystemStorage(location=''), upload_to='uploads', verbose_name='Rejects File'),
+        ),
+    ]
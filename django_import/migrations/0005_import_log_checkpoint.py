@@ -0,0 +1,24 @@
+# Generated by Django 4.2.30 on 2026-10-17 03:15
+
+from django.db import migrations, models
+import jsoneditor.fields.django_extensions_jsonfield
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_import', '0004_import_log_rejects_file'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importlog',
+            name='checkpoint',
+            field=models.BigIntegerField(blank=True, editable=False, help_text='Number of source rows processed and stored, the import is resumed from this row', null=True, verbose_name='Checkpoint'),
+        ),
+        migrations.AddField(
+            model_name='importlog',
+            name='options',
+            field=jsoneditor.fields.django_extensions_jsonfield.JSONField(blank=True, default=dict, editable=False, help_text='Options of the job when the import has been started', verbose_name='Options'),
+        ),
+    ]
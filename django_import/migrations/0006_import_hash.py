@@ -0,0 +1,34 @@
+# Generated by Django 4.2.30 on 2026-10-17 03:16
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('django_import', '0005_import_log_checkpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importlog',
+            name='rows_unchanged',
+            field=models.BigIntegerField(default=0, editable=False, help_text='Number of rows not changed since the last import', verbose_name='Rows Unchanged'),
+        ),
+        migrations.CreateModel(
+            name='ImportHash',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(help_text='Hash of identity values of the row', max_length=40, verbose_name='Key')),
+                ('digest', models.CharField(help_text='Hash of the source row and import options', max_length=16, verbose_name='Digest')),
+                ('model', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='import_hashes', to='contenttypes.contenttype', verbose_name='Model')),
+            ],
+            options={
+                'verbose_name': 'Import Hash',
+                'verbose_name_plural': 'Import Hashes',
+                'unique_together': {('model', 'key')},
+            },
+        ),
+    ]
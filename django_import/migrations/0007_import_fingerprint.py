@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-17 03:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_import', '0006_import_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='file_hash',
+            field=models.CharField(blank=True, default='', editable=False, help_text='Hash of the upload file content', max_length=64, verbose_name='File Hash'),
+        ),
+        migrations.AddField(
+            model_name='importjob',
+            name='fingerprint',
+            field=models.CharField(blank=True, default='', editable=False, help_text='Hash of the upload file content, options, and the model', max_length=64, verbose_name='Fingerprint'),
+        ),
+        migrations.AddField(
+            model_name='importlog',
+            name='fingerprint',
+            field=models.CharField(blank=True, default='', editable=False, help_text='Fingerprint of the job when the import has been started', max_length=64, verbose_name='Fingerprint'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-17 03:19
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_import', '0007_import_fingerprint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportRun',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resume', models.BooleanField(default=False, help_text='Whether the import should be resumed from the checkpoint', verbose_name='Resume')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Created At')),
+                ('claimed_by', models.CharField(blank=True, default='', help_text='Name of the worker processing the import', max_length=128, verbose_name='Claimed By')),
+                ('claimed_at', models.DateTimeField(blank=True, null=True, verbose_name='Claimed At')),
+                ('heartbeat_at', models.DateTimeField(blank=True, help_text='Timestamp when the worker has reported last time that the import is processed', null=True, verbose_name='Heartbeat At')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Attempts')),
+                ('log', models.ForeignKey(help_text='Log of the queued import', on_delete=django.db.models.deletion.CASCADE, related_name='runs', to='django_import.importlog', verbose_name='Log')),
+            ],
+            options={
+                'verbose_name': 'Import Run',
+                'verbose_name_plural': 'Import Runs',
+                'ordering': ['id'],
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.30 on 2026-10-17 03:27
+
+from django.db import migrations
+import jsoneditor.fields.django_extensions_jsonfield
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_import', '0008_import_run'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importlog',
+            name='profile',
+            field=jsoneditor.fields.django_extensions_jsonfield.JSONField(blank=True, default=dict, editable=False, help_text='Time, calls, latency percentiles, and queries of every import stage', verbose_name='Profile'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.30 on 2026-10-17 03:42
+
+from django.db import migrations
+import jsoneditor.fields.django_extensions_jsonfield
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_import', '0009_import_log_profile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importlog',
+            name='members',
+            field=jsoneditor.fields.django_extensions_jsonfield.JSONField(blank=True, default=dict, editable=False, help_text='Progress counters of every imported member of the archive', verbose_name='Members'),
+        ),
+    ]
@@ -1,11 +1,16 @@
+import hashlib
+import json
 import re
+import time
+from datetime import timedelta
 
 from jsoneditor.fields.django_extensions_jsonfield import JSONField
 
 from django.contrib.contenttypes.models import ContentType
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 from django.utils.functional import LazyObject
+from django.utils.html import format_html_join
 from django.utils.module_loading import import_string
 from django.utils.safestring import mark_safe
 
@@ -41,10 +46,13 @@ class Storage(LazyObject):
 class ImportJob(models.Model):
     """
 Every time the ImportJob instance is saved, the importing process
-is called, synchronously, or asynchronously, depending on the
-`async` value of the `DJANGO_IMPORT` variable in the settings
+is called, synchronously, or asynchronously using Celery or the database queue,
+depending on the `sync` value of the `DJANGO_IMPORT` variable in the settings
 file.
 
+Saving the job having the same file content, options, and the model
+may be skipped, depending on the `duplicates` value of the `DJANGO_IMPORT` variable.
+
 The `options` attribute has the complex structure to setup
 various custom import options.
 
@@ -53,6 +61,10 @@ various custom import options.
     functions, like `table`, `csv`, `fwf`, `excel`, `json`, or any other reading function returning
     a `DataFrame`, read [pandas documentation](https://pandas.pydata.org/docs/reference/io.html)
 
+- `engine` selects the parsing engine, like `pyarrow` or `c` for `csv`, or `calamine` for `excel`,
+    or a list of engines tried in order; engines not installed, or not supporting passed parameters
+    are skipped, falling back to the default one; `auto` means the fastest engine known for the format
+
 - `parameters` section determines parameters to be sent as additional
     parameters to the reading function. Check [pandas documentation](https://pandas.pydata.org/docs/reference/io.html)
     to see what additional parameters may or should be sent there
@@ -61,6 +73,17 @@ various custom import options.
     the only two, `rb` (read binary) and `rt` (read text) modes are supported;
     *note* that some custom storages don't support proper mode changing options
 
+- `local` may be set to `false` to read the file object returned by the storage as is; otherwise
+    files having local paths are read by the path, and files of remote storages are copied
+    to the local temporary file before reading
+
+- `columns` may be set to `false` to read all columns of the file; otherwise only columns used by reflections are read,
+    while the list of columns used by reflections reading the whole row, like custom ones, may be set here
+
+- `dtypes` may be set to `false` to use column types inferred by pandas; otherwise types are derived from
+    model fields, text and decimal columns are read as strings, numeric and date columns are converted
+    by chunks, and missing values are replaced by None
+
 - the `headers` determines a list of headers which should be assigned to
     data columns. Existent heades if present, are replaced. Length of the
     `headers` list should be equal to number of data columns
@@ -71,6 +94,50 @@ various custom import options.
 
 + `reflections` determines customization in translation data to
     field values.
+
+- `batch_size` determines a number of rows stored together in a single transaction;
+    rows having no values for the update stage are stored using
+    [`bulk_create()`](https://docs.djangoproject.com/en/2.2/ref/models/querysets/#bulk-create)
+    and [`bulk_update()`](https://docs.djangoproject.com/en/2.2/ref/models/querysets/#bulk-update),
+    identities of the whole batch are resolved by the only query;
+    if the batch fails, it is bisected to find, log and skip wrong rows only
+
+- `bulk` may be set to `false` to store batched rows one by one as usual,
+    though still in a single transaction per batch
+
+- `workers` determines a number of threads storing batches concurrently
+
+- `chunk_size` determines a number of rows read from the file at once, to avoid holding
+    the whole file in memory; supported for `csv`, `table`, `fwf`, `excel`, and line-delimited `json` formats
+
+- `sheets` lists sheets of the `excel` workbook imported by the job, or `true` to import all sheets;
+    every sheet may be a dictionary having the sheet `name` and its own `headers`
+
+- `compression` overrides the compression inferred from the file name suffix, like `gzip`, `bz2`, `xz`, `zstd`, or `zip`,
+    while `false` means the file is not compressed; compressed files are decompressed on the fly
+
+- `members` lists patterns of names of zip archive members to be imported, like `*.csv`, all members by default
+
+- `member_workers` determines a number of threads importing members of the zip archive concurrently
+
+- `vectorize` switches on vectorized reflections applied to the whole chunk column instead of every row;
+    reflections not having a vectorized version are applied row by row as usual
+
+- `lookup_cache_size` overrides the number of values cached by the `lookup` reflection;
+    values are looked up by a query per chunk with the `vectorize` option, otherwise by a query per value
+
+- `rejects` switches on writing failed rows to the rejects file linked from the import log,
+    instead of logging every failed row; `csv` and `jsonl` formats are available,
+    while `true` means the format of the import file where possible
+
+- `skip_unchanged` switches on skipping rows identified by the `identity`,
+    which have not been changed since the last import of the same model with the same options
+
+- `dry_run` switches on validation of reflected rows instead of storing them to the database;
+    numbers of errors by the field and by the error type are written to the log
+
+- `profile` switches on measuring every reflection separately, as the `reflect:<field>` stage of the profile
+    stored on the import log; otherwise the time of reflections is included in the `reflect` stage
     """
 
     model = models.ForeignKey(
@@ -90,6 +157,16 @@ various custom import options.
         upload_to=get_options()['storage']['upload_to'], storage=Storage(),
         verbose_name=_('Upload File'),
     )
+    file_hash = models.CharField(
+        max_length=64, blank=True, default='', editable=False,
+        verbose_name=_('File Hash'),
+        help_text=_('Hash of the upload file content'),
+    )
+    fingerprint = models.CharField(
+        max_length=64, blank=True, default='', editable=False,
+        verbose_name=_('Fingerprint'),
+        help_text=_('Hash of the upload file content, options, and the model'),
+    )
 
     def __str__(self):
         return '%(upload_file)s->%(model)s' % {
@@ -101,17 +178,75 @@ various custom import options.
         verbose_name = _('Import Job')
         verbose_name_plural = _('Import Jobs')
 
+    def get_fingerprint(self):
+        """
+        Returns the fingerprint of the upload file content, options, and the model.
+
+        The file content is hashed by chunks, only if the file is new.
+        """
+        if not self.file_hash or not self.upload_file._committed:
+            digest = hashlib.sha256()
+            for chunk in self.upload_file.chunks():
+                digest.update(chunk if isinstance(chunk, bytes) else chunk.encode('utf-8'))
+            if self.upload_file._committed:
+                self.upload_file.close()
+            self.file_hash = digest.hexdigest()
+        fingerprint = json.dumps(
+            [self.file_hash, self.options, self.model.app_label, self.model.model],
+            sort_keys=True, default=str,
+        )
+        return hashlib.sha256(fingerprint.encode('utf-8')).hexdigest()
+
+    def duplicate(self):
+        """
+        Returns the log of the duplicate import, if the import should be skipped
+        depending on the `duplicates` setting
+        """
+        duplicates = get_options().get('duplicates', 'import')
+        if duplicates not in ('skip', 'coalesce'):
+            return None
+        logs = self.logs.filter(fingerprint=self.fingerprint)
+        if duplicates == 'coalesce':
+            logs = logs.filter(is_finished=False)
+        return logs.order_by('id').last()
+
+    def coalesce(self):
+        """
+        Passes actual options to the import queued recently, if any, and returns its log
+        """
+        since = timezone.now() - timedelta(seconds=get_options().get('coalesce_interval', 3600))
+        queued = self.logs.filter(is_finished=False, started_at__isnull=True, imported_at__gte=since).order_by('id').last()
+        if not queued:
+            return None
+        if not ImportLog.objects.filter(id=queued.id, started_at__isnull=True).update(options=self.options, fingerprint=self.fingerprint):
+            return None
+        return queued
+
     def save(self, *av, **kw):
+        start = kw.pop('start', True)
+        # the file content is hashed only if duplicate imports are detected
+        if get_options().get('duplicates', 'import') in ('skip', 'coalesce'):
+            self.fingerprint = self.get_fingerprint()
+        else:
+            self.fingerprint = ''
         super(ImportJob, self).save(*av, **kw)
-        log = ImportLog.objects.create(job=self)
-        log.info(_('Starting import for: %s'), self.upload_file)
+        if not start:
+            return
+        log = self.duplicate()
+        if log:
+            log.info(_('Duplicate import skipped for: %s'), self.upload_file)
+            log.flush()
+            return
         sync = get_options().get('sync', True)
-        if not sync:
-            from .tasks import run_import
-            run_import.delay(log.id)
-        else:
-            from .import_task import run_import
-            run_import(log.id)
+        log = self.coalesce() if sync == 'queue' or not sync else None
+        if log:
+            log.info(_('Import coalesced with the queued import for: %s'), self.upload_file)
+            log.flush()
+            return
+        log = ImportLog.objects.create(job=self, options=self.options, fingerprint=self.fingerprint)
+        log.info(_('Starting import for: %s'), self.upload_file)
+        log.flush()
+        log.start()
 
 
 class ImportLog(models.Model):
@@ -137,9 +272,200 @@ class ImportLog(models.Model):
         default=False,
         verbose_name=_('Is Finished'),
     )
+    started_at = models.DateTimeField(
+        null=True, blank=True, editable=False,
+        verbose_name=_('Started At'),
+    )
+    finished_at = models.DateTimeField(
+        null=True, blank=True, editable=False,
+        verbose_name=_('Finished At'),
+    )
+    stages = JSONField(
+        blank=True, default=dict, editable=False,
+        verbose_name=_('Stages'),
+        help_text=_('Start and finish timestamps of every import stage'),
+    )
+    rows_total = models.BigIntegerField(
+        null=True, blank=True, editable=False,
+        verbose_name=_('Rows Total'),
+        help_text=_('Number of rows in the file if known'),
+    )
+    rows_read = models.BigIntegerField(
+        default=0, editable=False,
+        verbose_name=_('Rows Read'),
+    )
+    rows_imported = models.BigIntegerField(
+        default=0, editable=False,
+        verbose_name=_('Rows Imported'),
+    )
+    rows_skipped = models.BigIntegerField(
+        default=0, editable=False,
+        verbose_name=_('Rows Skipped'),
+        help_text=_('Number of rows having no reflected data'),
+    )
+    rows_unchanged = models.BigIntegerField(
+        default=0, editable=False,
+        verbose_name=_('Rows Unchanged'),
+        help_text=_('Number of rows not changed since the last import'),
+    )
+    rows_errored = models.BigIntegerField(
+        default=0, editable=False,
+        verbose_name=_('Rows Errored'),
+        help_text=_('Number of rows failed while reflecting or storing'),
+    )
+    bytes_total = models.BigIntegerField(
+        null=True, blank=True, editable=False,
+        verbose_name=_('Bytes Total'),
+    )
+    bytes_read = models.BigIntegerField(
+        null=True, blank=True, editable=False,
+        verbose_name=_('Bytes Read'),
+    )
+    current_chunk = models.IntegerField(
+        default=0, editable=False,
+        verbose_name=_('Current Chunk'),
+    )
+    options = JSONField(
+        blank=True, default=dict, editable=False,
+        verbose_name=_('Options'),
+        help_text=_('Options of the job when the import has been started'),
+    )
+    fingerprint = models.CharField(
+        max_length=64, blank=True, default='', editable=False,
+        verbose_name=_('Fingerprint'),
+        help_text=_('Fingerprint of the job when the import has been started'),
+    )
+    checkpoint = models.BigIntegerField(
+        null=True, blank=True, editable=False,
+        verbose_name=_('Checkpoint'),
+        help_text=_('Number of source rows processed and stored, the import is resumed from this row'),
+    )
+    rejects_file = models.FileField(
+        upload_to=get_options()['storage']['upload_to'], storage=Storage(),
+        blank=True, editable=False,
+        verbose_name=_('Rejects File'),
+        help_text=_('File containing rows rejected while importing'),
+    )
+    profile = JSONField(
+        blank=True, default=dict, editable=False,
+        verbose_name=_('Profile'),
+        help_text=_('Time, calls, latency percentiles, and queries of every import stage'),
+    )
+    members = JSONField(
+        blank=True, default=dict, editable=False,
+        verbose_name=_('Members'),
+        help_text=_('Progress counters of every imported member of the archive'),
+    )
+
+    console = None
+
+    def start(self, resume=False):
+        """
+        Starts the import synchronously, asynchronously using Celery, or using the database queue,
+        depending on the `sync` setting.
+
+        Asynchronous imports are queued when the current transaction is committed.
+        """
+        sync = get_options().get('sync', True)
+        if sync == 'queue':
+            transaction.on_commit(lambda: ImportRun.objects.create(log=self, resume=resume))
+        elif not sync:
+            from .tasks import resume_import, run_import
+            task = resume_import if resume else run_import
+            transaction.on_commit(lambda: task.delay(self.id))
+        else:
+            from .import_task import resume_import, run_import
+            (resume_import if resume else run_import)(self.id)
+
+    def resume(self):
+        """
+        Resumes the interrupted import from the checkpoint
+        """
+        self.start(resume=True)
+
+    def is_running(self):
+        """
+        Returns whether the import is queued, or still processed.
+
+        The import is considered processed, if its run has been claimed by the worker reporting heartbeats,
+        or if entries have been written to the log during the last `queue_timeout` seconds.
+        """
+        if self.is_finished:
+            return False
+        recent = timezone.now() - timedelta(seconds=get_options()['queue_timeout'])
+        if self.runs.filter(models.Q(claimed_at__isnull=True) | models.Q(heartbeat_at__gte=recent)).exists():
+            return True
+        return self.entries.filter(created_at__gte=recent).exists()
+
+    def progress(self, **counters):
+        """
+        Updates progress counters of the log, without saving the whole instance
+        """
+        for k, v in counters.items():
+            setattr(self, k, v)
+        if self.pk:
+            ImportLog.objects.filter(pk=self.pk).update(**counters)
+        if self.console:
+            self.console.progress(self)
+
+    def stage(self, name=None):
+        """
+        Finishes the current import stage, and starts a new one, if the name is passed
+        """
+        now = timezone.now().isoformat()
+        stages = dict(self.stages or {})
+        for stage in stages.values():
+            stage.setdefault('finished', now)
+        if name:
+            stages[name] = {'started': now}
+        self.progress(stages=stages)
+
+    def elapsed(self):
+        """
+        Returns the import duration in seconds
+        """
+        if not self.started_at:
+            return None
+        return ((self.finished_at or timezone.now()) - self.started_at).total_seconds()
+
+    def rows_per_second(self):
+        elapsed = self.elapsed()
+        if not elapsed:
+            return None
+        return round(self.rows_read / elapsed, 1)
+    rows_per_second.short_description = _("Rows per Second")
+
+    def eta(self):
+        """
+        Returns the estimated time of the import finish, based on the number of rows, or the file size
+        """
+        elapsed = self.elapsed()
+        if self.is_finished or not elapsed:
+            return None
+        if self.rows_total and self.rows_read:
+            left = elapsed * (self.rows_total - self.rows_read) / self.rows_read
+        elif self.bytes_total and self.bytes_read:
+            left = elapsed * (self.bytes_total - self.bytes_read) / self.bytes_read
+        else:
+            return None
+        return timezone.now() + timedelta(seconds=left)
+    eta.short_description = _("Estimated Finish")
+
+    def import_log_text(self):
+        """
+        Returns the whole log text, including log entries not stored yet
+        """
+        lines = [self.import_log] if self.import_log else []
+        if self.pk:
+            lines += ['%s' % entry for entry in self.entries.all()]
+        lines += ['%s' % entry for entry in getattr(self, '_entries', [])]
+        return '\n'.join(lines)
 
     def import_log_html(self):
-        return mark_safe(re.sub("\n", "<br/>", self.import_log))
+        html = mark_safe(re.sub("\n", "<br/>", self.import_log))
+        if self.pk:
+            html += format_html_join('', '{}<br/>', (('%s' % entry,) for entry in self.entries.all()))
+        return html
     import_log_html.allow_tags = True
     import_log_html.short_description = _("Detailed Import Log")
 
@@ -154,10 +480,17 @@ class ImportLog(models.Model):
         }
 
     def message(self, level, chapter, format, *av, **kw):
-        now = timezone.now()
+        """
+        Appends a new entry to the log.
+
+        Entries are buffered and stored together when the buffer is full,
+        or the flush interval has been expired, see `log_flush_count` and `log_flush_interval` settings.
+        The `row` attribute of the log, if set, is stored as a row number of the entry.
+        Entries and progress counters are also reported to the `console` of the log, if set.
+        """
         values = av if av else kw
         try:
-            message = '%s: [%s(%s)] %s' % (now, chapter, level, (format % values))
+            message = format % values
         except Exception as ex:
             try:
                 r = '%r' % values
@@ -167,9 +500,30 @@ class ImportLog(models.Model):
                 f = '%r' % format
             except Exception:
                 f = '<something strange>'
-            self.error('Error formatting %s using %s: %s', r, f, ex)
-        self.import_log += '\n%s' % message
-        self.save()
+            return self.error('Error formatting %s using %s: %s', r, f, ex)
+        if not hasattr(self, '_entries'):
+            self._entries = []
+            self._flushed = time.time()
+        entry = ImportLogEntry(
+            log=self, created_at=timezone.now(), level=level, chapter=chapter,
+            row=getattr(self, 'row', None), message=message,
+        )
+        self._entries.append(entry)
+        if self.console:
+            self.console.message(entry)
+        options = get_options()
+        if len(self._entries) >= options['log_flush_count'] or time.time() - self._flushed >= options['log_flush_interval']:
+            self.flush()
+
+    def flush(self):
+        """
+        Stores all buffered log entries, entries of the log not stored itself are dropped
+        """
+        entries = getattr(self, '_entries', [])
+        self._entries = []
+        self._flushed = time.time()
+        if entries and self.pk:
+            ImportLogEntry.objects.bulk_create(entries)
 
     def debug(self, format, *av, **kw):
         return self.message(5, 'DEBUG', format, *av, **kw)
@@ -188,4 +542,127 @@ class ImportLog(models.Model):
 
     def finish(self):
         self.is_finished = True
+        self.finished_at = timezone.now()
+        self.row = None
+        self.stage()
         self.info(_('Finished'))
+        self.flush()
+        self.save()
+
+
+class ImportLogEntry(models.Model):
+    """
+    Append-only entry of the import log
+    """
+    log = models.ForeignKey(
+        ImportLog, on_delete=models.CASCADE,
+        related_name='entries',
+        verbose_name=_('Log'),
+        help_text=_('Log to which the entry is related'),
+    )
+    created_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name=_('Created At'),
+    )
+    level = models.PositiveSmallIntegerField(
+        verbose_name=_('Level'),
+    )
+    chapter = models.CharField(
+        max_length=16,
+        verbose_name=_('Chapter'),
+    )
+    row = models.BigIntegerField(
+        null=True, blank=True,
+        verbose_name=_('Row'),
+        help_text=_('Number of the data row processed when the entry has been written'),
+    )
+    message = models.TextField(
+        verbose_name=_('Message'),
+    )
+
+    class Meta:
+        verbose_name = _('Import Log Entry')
+        verbose_name_plural = _('Import Log Entries')
+        ordering = ['id']
+
+    def __str__(self):
+        if self.row is not None:
+            return '%s: [%s(%s)] row %s: %s' % (self.created_at, self.chapter, self.level, self.row, self.message)
+        return '%s: [%s(%s)] %s' % (self.created_at, self.chapter, self.level, self.message)
+
+
+class ImportHash(models.Model):
+    """
+    Hash of the source row stored by the last import, by the model and the identity
+    """
+    model = models.ForeignKey(
+        ContentType,
+        on_delete=models.CASCADE,
+        related_name='import_hashes',
+        verbose_name=_("Model"),
+    )
+    key = models.CharField(
+        max_length=40,
+        verbose_name=_('Key'),
+        help_text=_('Hash of identity values of the row'),
+    )
+    digest = models.CharField(
+        max_length=16,
+        verbose_name=_('Digest'),
+        help_text=_('Hash of the source row and import options'),
+    )
+
+    class Meta:
+        verbose_name = _('Import Hash')
+        verbose_name_plural = _('Import Hashes')
+        unique_together = [('model', 'key')]
+
+    def __str__(self):
+        return '%s:%s' % (self.key, self.digest)
+
+
+class ImportRun(models.Model):
+    """
+    Import queued to be started by the `import_worker` command
+    """
+    log = models.ForeignKey(
+        ImportLog, on_delete=models.CASCADE,
+        related_name='runs',
+        verbose_name=_('Log'),
+        help_text=_('Log of the queued import'),
+    )
+    resume = models.BooleanField(
+        default=False,
+        verbose_name=_('Resume'),
+        help_text=_('Whether the import should be resumed from the checkpoint'),
+    )
+    created_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name=_('Created At'),
+    )
+    claimed_by = models.CharField(
+        max_length=128, blank=True, default='',
+        verbose_name=_('Claimed By'),
+        help_text=_('Name of the worker processing the import'),
+    )
+    claimed_at = models.DateTimeField(
+        null=True, blank=True,
+        verbose_name=_('Claimed At'),
+    )
+    heartbeat_at = models.DateTimeField(
+        null=True, blank=True,
+        verbose_name=_('Heartbeat At'),
+        help_text=_('Timestamp when the worker has reported last time that the import is processed'),
+    )
+    attempts = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_('Attempts'),
+    )
+
+    class Meta:
+        verbose_name = _('Import Run')
+        verbose_name_plural = _('Import Runs')
+        ordering = ['id']
+
+    def __str__(self):
+        return '%s: %s' % (self.created_at, self.log)
@@ -0,0 +1,87 @@
+"""
+The writer pool stores batches concurrently, using a fixed number of threads.
+
+Every thread uses its own database connection, closed when the pool is closed.
+Results of submitted batches are returned as futures.
+"""
+import threading
+
+from six.moves.queue import Queue
+
+from django.db import connection
+
+
+try:
+    from concurrent.futures import Future
+except ImportError:
+    class Future(object):
+        """
+        Minimal future used if `concurrent.futures` is not available
+        """
+        def __init__(self):
+            self.done = threading.Event()
+            self.value = None
+            self.exception = None
+
+        def set_running_or_notify_cancel(self):
+            return True
+
+        def set_result(self, value):
+            self.value = value
+            self.done.set()
+
+        def set_exception(self, exception):
+            self.exception = exception
+            self.done.set()
+
+        def result(self):
+            self.done.wait()
+            if self.exception is not None:
+                raise self.exception
+            return self.value
+
+
+class WriterPool(object):
+    """
+    Pool of threads calling submitted functions
+    """
+    def __init__(self, workers):
+        self.workers = workers
+        self.tasks = Queue()
+        self.threads = [threading.Thread(target=self.work) for number in range(workers)]
+        for thread in self.threads:
+            thread.daemon = True
+            thread.start()
+
+    def work(self):
+        try:
+            while True:
+                task = self.tasks.get()
+                if task is None:
+                    return
+                future, function, av = task
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    future.set_result(function(*av))
+                except Exception as ex:
+                    future.set_exception(ex)
+        finally:
+            connection.close()
+
+    def submit(self, function, *av):
+        """
+        Submits the function to be called by the pool, returns a future of the result
+        """
+        future = Future()
+        self.tasks.put((future, function, av))
+        return future
+
+    def close(self):
+        """
+        Waits for all submitted functions, and stops threads
+        """
+        for thread in self.threads:
+            self.tasks.put(None)
+        for thread in self.threads:
+            thread.join()
@@ -0,0 +1,230 @@
+"""
+The import plan is compiled once per job from the `reflections` option and the model fields.
+
+The plan contains a step for every field to be reflected, with the resolved reflection function
+having parameters bound, optional vectorized and prefetching versions of the function, and the list of columns
+used by the reflection. Chains of the `combine` reflection are flattened to the list of steps.
+
+The whole plan is validated when compiled, before any rows are processed.
+"""
+import inspect
+import re
+import string
+from functools import partial
+
+from pandas import DataFrame
+from six import string_types
+
+from django.core.exceptions import ImproperlyConfigured
+
+
+try:
+    from django.utils.translation import ugettext_lazy as _
+except ImportError:
+    from django.utils.translation import gettext_lazy as _
+
+from . import reflections as reflect
+
+
+def _combine(functions, context, model, field_name, data, log):
+    """Internal helper applying compiled reflections sequentially"""
+    for function in functions:
+        c, u = function(context, model, field_name, data, log)
+        data = {}
+        data.update(c)
+        data.update(u)
+    return c, u
+
+
+def _vectorized_combine(functions, context, model, field_name, dataset, log):
+    """Internal helper applying compiled vectorized reflections sequentially"""
+    for function in functions:
+        c, u = function(context, model, field_name, dataset, log)
+        data = {}
+        data.update(c)
+        data.update(u)
+        indexes = [values.index for values in data.values()]
+        if any(not index.equals(indexes[0]) for index in indexes):
+            raise ValueError('Combined reflections return values for different rows: %s' % field_name)
+        dataset = DataFrame(data)
+    return c, u
+
+
+def _arguments(function):
+    """Internal helper returning argument names of the function"""
+    if hasattr(inspect, 'signature'):
+        return list(inspect.signature(function).parameters)
+    return inspect.getargspec(function).args
+
+
+def _format_columns(format):
+    """Internal helper returning column names used by the %-style format"""
+    return re.findall(r'%\(([^)]*)\)', format)
+
+
+def _xformat_columns(format):
+    """Internal helper returning column names used by the {}-style format"""
+    columns = []
+    for literal, name, spec, conversion in string.Formatter().parse(format):
+        if name is None:
+            continue
+        match = re.match(r'^0?\[([^\]]*)\]', name)
+        if not match:
+            return None
+        columns.append(match.group(1))
+    return columns
+
+
+class Step(object):
+    """
+    Compiled reflection for the field
+    """
+    __slots__ = ('field_name', 'name', 'parameters', 'function', 'vectorized', 'columns', 'prefetch')
+
+    def __init__(self, field_name, name, parameters, function, vectorized, columns, prefetch=None):
+        self.field_name = field_name
+        self.name = name
+        self.parameters = parameters
+        self.function = function
+        self.vectorized = vectorized
+        self.columns = columns
+        self.prefetch = prefetch
+
+
+class ImportPlan(object):
+    """
+    Reflection plan compiled once per job.
+
+    Raises `ImproperlyConfigured` listing all found problems if the plan is not valid.
+    """
+    def __init__(self, model, reflections):
+        self.model = model
+        self.errors = []
+        self.steps = []
+        for field_name in sorted(set(reflections.keys()).union(f.name for f in model._meta.fields)):
+            step = self.compile(field_name, reflections.get(field_name, 'direct'))
+            if step:
+                self.steps.append(step)
+        if self.errors:
+            raise ImproperlyConfigured('; '.join(self.errors))
+
+    def error(self, format, *av):
+        self.errors.append(format % av)
+
+    def source_columns(self, columns=None):
+        """
+        Returns a sorted list of source columns used by reflections,
+        or None if any reflection may use the whole row.
+
+        If the list of additional `columns` is passed, it is added to the result,
+        and reflections using the whole row are expected to use only these columns.
+        """
+        found = set(columns or [])
+        for step in self.steps:
+            if step.columns is None:
+                if columns is None:
+                    return None
+                continue
+            found.update(step.columns)
+        return sorted(found)
+
+    def compile(self, field_name, reflection):
+        """
+        Compiles the reflection for the field, returns a `Step` or None if the reflection is not valid
+        """
+        if isinstance(reflection, string_types):
+            reflection = {
+                'function': reflection
+            }
+        if not isinstance(reflection, dict):
+            self.error(_("The reflection is not formatted properly: %s"), reflection)
+            return None
+        name = reflection.get('function', None)
+        if not name:
+            self.error(_('Function name is empty: %s'), field_name)
+            return None
+        parameters = reflection.get('parameters', {})
+        if not isinstance(parameters, dict):
+            self.error(_('Parameters of the reflection %s are not formatted properly: %s'), name, field_name)
+            return None
+        function = getattr(reflect, 'reflection_%s' % name, None)
+        if not function:
+            self.error(_('Reflection function %s has not been registered: %s'), name, field_name)
+            return None
+        if name == 'combine':
+            return self.compile_combine(field_name, parameters)
+        if not self.check_parameters(field_name, name, function, parameters):
+            return None
+        vectorized = getattr(reflect, 'vectorized_%s' % name, None)
+        prefetch = getattr(reflect, 'prefetch_%s' % name, None)
+        return Step(
+            field_name, name, parameters,
+            partial(function, **parameters),
+            partial(vectorized, **parameters) if vectorized else None,
+            self.columns(field_name, name, function, parameters),
+            partial(prefetch, **parameters) if prefetch else None,
+        )
+
+    def compile_combine(self, field_name, parameters):
+        """
+        Compiles the `combine` reflection flattening the chain of combined reflections
+        """
+        reflections = parameters.get('reflections', [])
+        if not isinstance(reflections, list) or not reflections or set(parameters) - set(['reflections']):
+            self.error(_('Combined reflections should be a non-empty list: %s'), field_name)
+            return None
+        steps = []
+        for reflection in reflections:
+            step = self.compile(field_name, reflection)
+            if not step:
+                return None
+            steps.extend(step.parameters['steps'] if step.name == 'combine' else [step])
+        vectorized = None
+        if all(step.vectorized for step in steps):
+            vectorized = partial(_vectorized_combine, [step.vectorized for step in steps])
+        return Step(
+            field_name, 'combine', {'steps': steps},
+            partial(_combine, [step.function for step in steps]),
+            vectorized,
+            steps[0].columns,
+        )
+
+    def check_parameters(self, field_name, name, function, parameters):
+        """
+        Checks whether the reflection function accepts passed parameters
+        """
+        signature = getattr(inspect, 'signature', None)
+        if not signature:
+            return True
+        try:
+            signature = signature(function)
+        except (TypeError, ValueError):
+            return True
+        try:
+            signature.bind(None, self.model, field_name, {}, None, **parameters)
+        except TypeError as ex:
+            self.error(_('Wrong parameters of the reflection %s: %s, %s'), name, field_name, ex)
+            return False
+        return True
+
+    def columns(self, field_name, name, function, parameters):
+        """
+        Returns a list of columns used by the reflection, or None if the whole row may be used.
+
+        Custom reflections are expected to use the whole row, columns are derived only for built-in reflections.
+        """
+        if getattr(function, '__module__', None) != reflect.__name__:
+            return None
+        if name in ('constant', 'avoid'):
+            return []
+        if name == 'format':
+            return _format_columns(parameters.get('format', ''))
+        if name == 'xformat':
+            return _xformat_columns(parameters.get('format', ''))
+        try:
+            arguments = _arguments(function)
+        except (TypeError, ValueError):
+            return None
+        if 'column' in arguments:
+            return [parameters.get('column', None) or field_name]
+        return None
@@ -0,0 +1,188 @@
+"""
+The profiler measures time spent in every stage of the import pipeline, and counts database queries of stages.
+
+Stages are nested, the time of a nested stage is excluded from the time of the enclosing one.
+Queries are counted by the database execute wrapper, and attributed to the current stage of the calling thread.
+The summary of stages is stored on the import log, and passed to the `profile_hook` set in settings.
+"""
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+import six
+
+from django.utils.module_loading import import_string
+
+
+try:
+    from django.utils.translation import ugettext_lazy as _
+except ImportError:
+    from django.utils.translation import gettext_lazy as _
+
+from .config import get_options
+
+
+SAMPLES = 10000
+PERCENTILES = (50, 90, 99)
+
+
+@contextmanager
+def _nothing():
+    yield
+
+
+class Timing(object):
+    """
+    Cumulative time, a number of calls, and queries of the stage,
+    and the reservoir of latency samples used to estimate percentiles
+    """
+    def __init__(self, seed):
+        self.seconds = 0.0
+        self.calls = 0
+        self.queries = 0
+        self.slowest = 0.0
+        self.samples = []
+        self.random = random.Random(seed)
+
+    def add(self, seconds):
+        self.seconds += seconds
+        self.calls += 1
+        self.slowest = max(self.slowest, seconds)
+        if len(self.samples) < SAMPLES:
+            self.samples.append(seconds)
+        else:
+            ind = self.random.randint(0, self.calls - 1)
+            if ind < SAMPLES:
+                self.samples[ind] = seconds
+
+    def summary(self):
+        samples = sorted(self.samples)
+        summary = {
+            'seconds': round(self.seconds, 6),
+            'calls': self.calls,
+            'queries': self.queries,
+            'max': round(self.slowest, 6),
+        }
+        for p in PERCENTILES:
+            summary['p%s' % p] = round(samples[min(len(samples) - 1, len(samples) * p // 100)], 6) if samples else None
+        return summary
+
+
+class Profiler(object):
+    """
+    Collects timings and query counts of import stages.
+
+    Reflections are measured field by field only if `detailed` is set,
+    otherwise their time is included in the `reflect` stage.
+    """
+    def __init__(self, detailed=False):
+        self.detailed = detailed
+        self.timings = {}
+        self.queries = 0
+        self.started = time.time()
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def _timing(self, name):
+        timing = self.timings.get(name)
+        if timing is None:
+            with self.lock:
+                timing = self.timings.setdefault(name, Timing(name))
+        return timing
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Measures the code block as the stage
+        """
+        stack = self.local.__dict__.setdefault('stack', [])
+        frame = [name, time.time(), 0.0]
+        stack.append(frame)
+        try:
+            yield
+        finally:
+            stack.pop()
+            elapsed = time.time() - frame[1]
+            if stack:
+                stack[-1][2] += elapsed
+            timing = self._timing(name)
+            with self.lock:
+                timing.add(elapsed - frame[2])
+
+    def reflection(self, field_name):
+        """
+        Measures the reflection of the field as the `reflect:<field_name>` stage, if `detailed` is set
+        """
+        if not self.detailed:
+            return _nothing()
+        return self.stage('reflect:%s' % field_name)
+
+    def timed(self, items, name):
+        """
+        Yields all items, measuring time spent to get them as the stage
+        """
+        items = iter(items)
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(items)
+                except StopIteration:
+                    return
+            yield item
+
+    def __call__(self, execute, sql, params, many, context):
+        stack = getattr(self.local, 'stack', None)
+        timing = self._timing(stack[-1][0] if stack else 'other')
+        with self.lock:
+            timing.queries += 1
+            self.queries += 1
+        return execute(sql, params, many, context)
+
+    @contextmanager
+    def connect(self, connection):
+        """
+        Counts queries executed by the connection, if not counted yet,
+        and if the connection supports execute wrappers (Django 2.0+)
+        """
+        if not hasattr(connection, 'execute_wrapper') or self in connection.execute_wrappers:
+            yield
+            return
+        with connection.execute_wrapper(self):
+            yield
+
+    def totals(self):
+        """
+        Returns seconds spent in every stage
+        """
+        return dict((name, timing.seconds) for name, timing in list(self.timings.items()))
+
+    def summary(self):
+        """
+        Returns the summary of all stages, suitable to be stored as JSON
+        """
+        return {
+            'seconds': round(time.time() - self.started, 6),
+            'queries': self.queries,
+            'stages': dict((name, timing.summary()) for name, timing in list(self.timings.items())),
+        }
+
+    def report(self, log):
+        """
+        Stores the summary to the log, logs the time spent by stages, and calls the `profile_hook`
+        """
+        summary = self.summary()
+        log.progress(profile=summary)
+        stages = sorted(summary['stages'].items(), key=lambda s: -s[1]['seconds'])
+        log.info(_('Time by stage: %s'), ', '.join(
+            '%s %.3fs/%s calls/%s queries' % (name, s['seconds'], s['calls'], s['queries']) for name, s in stages
+        ))
+        hook = get_options().get('profile_hook')
+        if hook:
+            if isinstance(hook, six.string_types):
+                hook = import_string(hook)
+            try:
+                hook(log, summary)
+            except Exception as ex:
+                log.warning(_('Profile hook failed: %s'), ex)
+        return summary
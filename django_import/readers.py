@@ -0,0 +1,366 @@
+"""
+Readers get data from the import file as a sequence of pandas DataFrame chunks.
+
+The whole file is read as a single chunk by default. Formats whose pandas reading functions
+support the `chunksize` parameter may be read by chunks of limited size, to avoid
+holding the whole file in memory.
+
+The reading function is either the reader registered for the format, or the pandas `read_<format>` function.
+The parsing engine may be selected by the `engine` option, falling back to the next engine,
+and finally to the default one, if the engine is not installed, or does not support passed parameters.
+
+Files stored locally are read by the filesystem path, to let pandas use its fast paths, like memory mapping,
+and the compression inference by the file name. Files of remote storages are spooled to the local temporary file.
+
+Rows of every chunk are lazily presented to reflections as lightweight read-only mapping views.
+"""
+import importlib
+import os
+import tempfile
+
+import pandas
+from six import string_types
+
+from .spreadsheets import read_excel
+
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+try:
+    from django.utils.translation import ugettext_lazy as _
+except ImportError:
+    from django.utils.translation import gettext_lazy as _
+
+
+STREAMING_FORMATS = ['csv', 'table', 'fwf', 'json', 'excel']
+
+# Engines tried for the format when the `engine` option is `auto`
+ENGINES = {
+    'csv': ['pyarrow'],
+    'table': ['pyarrow'],
+    'excel': ['calamine'],
+}
+
+# Modules required by parsing engines
+ENGINE_MODULES = {
+    'pyarrow': 'pyarrow',
+    'calamine': 'python_calamine',
+    'openpyxl': 'openpyxl',
+    'xlrd': 'xlrd',
+    'odf': 'odf',
+    'pyxlsb': 'pyxlsb',
+}
+
+# Engines not supporting the `chunksize` parameter
+UNCHUNKED_ENGINES = ['pyarrow']
+
+# Formats read using the memory mapping, and engines not supporting it
+MAPPED_FORMATS = ['csv', 'table']
+UNMAPPED_ENGINES = ['pyarrow']
+
+SPOOL_CHUNK_SIZE = 8 * 1024 * 1024
+
+# Engines selecting columns only by the list of names present in the file
+LISTED_ENGINES = ['pyarrow']
+
+# Parameters of reading functions selecting columns to be read
+PROJECTIONS = {
+    'csv': 'usecols',
+    'table': 'usecols',
+    'fwf': 'usecols',
+    'excel': 'usecols',
+    'parquet': 'columns',
+    'feather': 'columns',
+    'orc': 'columns',
+}
+
+READERS = {
+    'excel': read_excel,
+}
+
+
+def register_reader(name, func):
+    """
+    Register a new reader function for the format
+
+    The reader function has the same signature as pandas reading functions:
+    ```
+    def reader(file, **parameters):
+        ...
+        return dataset
+    ```
+    where:
+        - `file` - file-like object, or the path of the local file to be read
+        - `parameters` - parameters from the job options.parameters chapter, and `engine` if selected
+
+    It returns the DataFrame, or the iterator of DataFrame chunks if the `chunksize` parameter is passed.
+    Registered readers override pandas reading functions of the same format.
+    """
+    READERS[name] = func
+
+
+def get_reader(format):
+    """
+    Returns the reading function for the format, or None if not found
+    """
+    return READERS.get(format) or getattr(pandas, 'read_%s' % format, None)
+
+
+def get_engines(format, engine):
+    """
+    Returns a list of engines to be tried for the format using the `engine` option
+    """
+    if not engine:
+        return []
+    if isinstance(engine, string_types):
+        engine = [engine]
+    engines = []
+    for name in engine:
+        engines.extend(ENGINES.get(format, []) if name == 'auto' else [name])
+    return engines
+
+
+def _installed(engine):
+    """Internal helper checking whether the module required by the engine is installed"""
+    module = ENGINE_MODULES.get(engine)
+    if not module:
+        return True
+    try:
+        importlib.import_module(module)
+    except ImportError:
+        return False
+    return True
+
+
+def _rewind(file):
+    """Internal helper moving to the start of the file, returns False if not possible"""
+    if isinstance(file, LocalFile):
+        file.position = None
+        return True
+    try:
+        file.seek(0)
+    except Exception:
+        return False
+    return True
+
+
+class LocalFile(object):
+    """
+    Local file read by the path, and the position of the reader in this file if known
+    """
+    def __init__(self, path):
+        self.path = path
+        self.position = None
+
+    def tell(self):
+        return self.position
+
+    def __str__(self):
+        return self.path
+
+
+def _position(reader):
+    """Internal helper returning the position of the pandas reader in the file, or None if unknown"""
+    try:
+        return reader.handles.handle.tell()
+    except Exception:
+        return None
+
+
+def project(format, parameters, columns, header=None):
+    """
+    Returns parameters of the reading function extended to read only the columns.
+
+    Columns are selected by the callable where supported, so columns absent in the file are just ignored.
+    If the `header` of the file is passed, columns are selected by the list of names present in the header instead.
+    """
+    parameters = dict(parameters)
+    if PROJECTIONS[format] == 'usecols':
+        columns = frozenset(columns)
+        parameters['usecols'] = [c for c in header if c in columns] if header is not None else columns.__contains__
+    else:
+        parameters['columns'] = list(columns)
+    return parameters
+
+
+def _header(file, read_function, parameters):
+    """Internal helper reading column names of the file by the default engine, returns None if not possible"""
+    parameters = dict((k, v) for k, v in parameters.items() if k not in ('usecols', 'dtype', 'engine', 'memory_map'))
+    try:
+        header = read_function(file.path if isinstance(file, LocalFile) else file, nrows=0, **parameters).columns
+    except Exception:
+        header = None
+    if not _rewind(file):
+        return None
+    return None if header is None else list(header)
+
+
+def local_path(file):
+    """
+    Returns the filesystem path of the file, or None if the file is not stored locally
+    """
+    if getattr(file, 'storage', None) is not None:
+        try:
+            path = file.storage.path(file.name)
+        except NotImplementedError:
+            return None
+    else:
+        path = getattr(getattr(file, 'file', None), 'name', None)
+    if isinstance(path, string_types) and os.path.isfile(path):
+        return path
+    return None
+
+
+def spool(file, mode='rb'):
+    """
+    Copies the file of the remote storage to the local temporary file by large sequential chunks.
+
+    Returns the temporary file, removed when closed.
+    The file name suffix is kept to let pandas infer the compression.
+    """
+    suffix = '-%s' % os.path.basename(file.name or '')
+    local = tempfile.NamedTemporaryFile('w+b' if 'b' in mode else 'w+t', suffix=suffix)
+    try:
+        for chunk in file.chunks(SPOOL_CHUNK_SIZE):
+            local.write(chunk)
+        local.flush()
+    except Exception:
+        local.close()
+        raise
+    return local
+
+
+def read_chunks(log, file, format, read_function, parameters, chunk_size=None, engines=None, columns=None):
+    """
+    Reads the file using the pandas reading function, and yields DataFrame chunks.
+
+    The file is either a file-like object, or the `LocalFile` read by the path,
+    using the memory mapping for `csv` and `table` formats.
+
+    If the `chunk_size` is set, and the format supports it, the file is read
+    by chunks of `chunk_size` rows, otherwise the whole file is read as a single chunk.
+
+    Parsing `engines` are tried in order, until the first chunk is read successfully,
+    then the file is read without the engine set.
+
+    If the list of `columns` is passed, and the format supports it, only these columns are read.
+    All columns are read if reading of selected columns fails, or none of them is found.
+    """
+    if chunk_size and format not in STREAMING_FORMATS:
+        log.warning(_('Reading by chunks is not supported for the %s format, the whole file is read'), format)
+        chunk_size = None
+    if chunk_size and format == 'json' and not parameters.get('lines', False):
+        log.warning(_('Reading by chunks is supported only for the line-delimited json, the whole file is read'))
+        chunk_size = None
+    if columns is not None and format not in PROJECTIONS:
+        columns = None
+    attempts = [(engine, columns) for engine in list(engines or []) + [None]]
+    if columns is not None:
+        attempts.append((None, None))
+    for engine, projected in attempts:
+        if engine and not _installed(engine):
+            log.info(_('Parsing engine %s is not installed, skipped'), engine)
+            continue
+        if engine and chunk_size and engine in UNCHUNKED_ENGINES:
+            log.info(_('Parsing engine %s does not support reading by chunks, skipped'), engine)
+            continue
+        params = parameters
+        if projected is not None:
+            header = None
+            if (engine or parameters.get('engine')) in LISTED_ENGINES and PROJECTIONS[format] == 'usecols':
+                header = _header(file, read_function, parameters)
+            params = project(format, parameters, projected, header)
+        if isinstance(file, LocalFile) and format in MAPPED_FORMATS and (engine or parameters.get('engine')) not in UNMAPPED_ENGINES:
+            params = dict(params)
+            params.setdefault('memory_map', True)
+        chunks = _read_chunks(file, read_function, params, chunk_size, engine)
+        try:
+            chunk = next(chunks)
+        except StopIteration:
+            return
+        except (ImportError, ValueError, TypeError, KeyError) as ex:
+            if (not engine and projected is None) or not _rewind(file):
+                raise
+            if engine:
+                log.warning(_('Parsing engine %s failed, trying the next one: %s'), engine, ex)
+            else:
+                log.warning(_('Reading selected columns failed, reading all columns: %s'), ex)
+            continue
+        if projected is not None and not len(chunk.columns) and _rewind(file):
+            chunks.close()
+            log.warning(_('Columns used by reflections are not found, reading all columns'))
+            continue
+        if engine:
+            log.info(_('File is parsed using the %s engine'), engine)
+        yield chunk
+        for chunk in chunks:
+            yield chunk
+        return
+
+
+def _read_chunks(file, read_function, parameters, chunk_size=None, engine=None):
+    """Internal helper reading the file using the parsing engine"""
+    local = file if isinstance(file, LocalFile) else None
+    if local:
+        file = local.path
+    if engine:
+        parameters = dict(parameters, engine=engine)
+    if chunk_size:
+        reader = read_function(file, chunksize=chunk_size, **parameters)
+    else:
+        reader = read_function(file, **parameters)
+        if isinstance(reader, pandas.DataFrame):
+            if local:
+                local.position = os.path.getsize(local.path)
+            yield reader
+            return
+    try:
+        for chunk in reader:
+            if local:
+                local.position = _position(reader)
+            yield chunk
+    finally:
+        close = getattr(reader, 'close', None)
+        if close:
+            close()
+
+
+class Row(Mapping):
+    """
+    Lightweight read-only mapping view of the data row.
+
+    The view refers to a tuple of row values, and a dictionary of column positions
+    in this tuple, shared between all rows of the chunk.
+    """
+    __slots__ = ('_positions', '_values')
+
+    def __init__(self, positions, values):
+        self._positions = positions
+        self._values = values
+
+    def __getitem__(self, column):
+        return self._values[self._positions[column]]
+
+    def __contains__(self, column):
+        return column in self._positions
+
+    def __iter__(self):
+        return iter(self._positions)
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+
+def iterate_dataset(dataset):
+    """
+    Lazily yields index and `Row` view for every row of the dataset.
+    """
+    positions = dict((column, position + 1) for position, column in enumerate(dataset.columns))
+    for values in dataset.itertuples(index=True, name=None):
+        yield values[0], Row(positions, values)
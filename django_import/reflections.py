@@ -30,8 +30,21 @@ The returned values may be used in two stages:
   instance attribute, and the instance is saved
 
 Every reflection returns data for create and update stages separately.
+
+If the `vectorize` option of the ImportJob is set, the vectorized version of the
+reflection function is used, if it is present. The vectorized version is named
+as `vectorized_<name>` and has the same signature, but gets the whole chunk DataFrame
+instead of the data row. It returns dictionaries of pandas Series for create and update stages,
+indexed by the chunk index. Rows having no value for the field are just absent in the Series.
+
+The reflection is applied row by row, if the vectorized version is absent,
+or fails for some reason.
 """
-from functools import partial
+import re
+from functools import partial, reduce
+
+from pandas import DataFrame, Series
+from pandas.api.types import infer_dtype
 
 from django.core.exceptions import FieldDoesNotExist
 
@@ -50,6 +63,22 @@ def _get_field(model, field_name):
         return None
 
 
+def _column(dataset, column):
+    """Internal helper to get the dataset column as a Series, or None if absent"""
+    if column not in dataset.columns:
+        return None
+    values = dataset[column]
+    if isinstance(values, DataFrame):
+        values = values.iloc[:, -1]
+    return values
+
+
+def _check_strings(values):
+    """Internal helper checking that all values are strings to use vectorized string methods"""
+    if len(values) and infer_dtype(values, skipna=False) != 'string':
+        raise TypeError('String values expected')
+
+
 def reflection_direct(context, model, field_name, data, log, column=None):
     """
 `direct` reflection sends the column value to the instance create parameters
@@ -66,6 +95,16 @@ available parameters:
     return {field_name: value}, {}
 
 
+def vectorized_direct(context, model, field_name, dataset, log, column=None):
+    """Vectorized version of the `direct` reflection"""
+    if column is None:
+        column = field_name
+    values = _column(dataset, column)
+    if values is None:
+        return {}, {}
+    return {field_name: values}, {}
+
+
 def reflection_update(context, model, field_name, data, log, column=None):
     """
 `update` reflection sends the column value to the instance update parameters
@@ -79,6 +118,12 @@ available parameters:
     return {}, update
 
 
+def vectorized_update(context, model, field_name, dataset, log, column=None):
+    """Vectorized version of the `update` reflection"""
+    create, update = vectorized_direct(context, model, field_name, dataset, log, column=column)
+    return {}, create
+
+
 def reflection_constant(context, model, field_name, data, log, value=None):
     """
 `constant` reflection sets the field value to the constant
@@ -90,6 +135,11 @@ available parameters:
     return {field_name: value}, {}
 
 
+def vectorized_constant(context, model, field_name, dataset, log, value=None):
+    """Vectorized version of the `constant` reflection"""
+    return {field_name: Series([value] * len(dataset.index), index=dataset.index, dtype=object)}, {}
+
+
 def reflection_avoid(*av, **kw):
     """
 `avoid` reflection excludes the field from the import, to
@@ -101,6 +151,11 @@ Any additional parameters are avoided also.
     return {}, {}
 
 
+def vectorized_avoid(*av, **kw):
+    """Vectorized version of the `avoid` reflection"""
+    return {}, {}
+
+
 def reflection_clean(context, model, field_name, data, log, column=None):
     """
 `clean` reflection cleans the column value by the field clean function
@@ -120,6 +175,18 @@ available parameters:
     return {field_name: value}, {}
 
 
+def vectorized_clean(context, model, field_name, dataset, log, column=None):
+    """Vectorized version of the `clean` reflection"""
+    field = _get_field(model, field_name)
+    if not field:
+        return {}, {}
+
+    create, update = vectorized_direct(context, model, field_name, dataset, log, column=column)
+    if not create:
+        return {}, {}
+    return {field_name: create[field_name].map(lambda value: field.clean(value, model))}, {}
+
+
 def reflection_substr(context, model, field_name, data, log, column=None, start=0, length=None):
     """
 `substr` reflection gets a substring from the data column
@@ -145,6 +212,22 @@ available parameters:
     return {field_name: value}, {}
 
 
+def vectorized_substr(context, model, field_name, dataset, log, column=None, start=0, length=None):
+    """Vectorized version of the `substr` reflection"""
+    field = _get_field(model, field_name)
+    if length is None:
+        length = getattr(field, 'max_length', 0)
+        if not length:
+            log.warning(_('Can not determine length for the substr: %s'), field_name)
+            return {}, {}
+    create, update = vectorized_direct(context, model, field_name, dataset, log, column=column)
+    if not create:
+        return {}, {}
+    values = create[field_name]
+    _check_strings(values)
+    return {field_name: values.str.slice(start, start + length)}, {}
+
+
 def reflection_replace(context, model, field_name, data, log, column=None, search=None, replace=None, count=None):
     """
 `replace` reflection gets a value from the data column with `search` value replaced by the `replace` value.
@@ -172,6 +255,21 @@ available parameters:
     return {field_name: value}, {}
 
 
+def vectorized_replace(context, model, field_name, dataset, log, column=None, search=None, replace=None, count=None):
+    """Vectorized version of the `replace` reflection"""
+    if search is None:
+        log.warning(_('Set the search value: %s'), field_name)
+        return {}, {}
+    if replace is None:
+        replace = ''
+    create, update = vectorized_direct(context, model, field_name, dataset, log, column=column)
+    if not create:
+        return {}, {}
+    values = create[field_name]
+    _check_strings(values)
+    return {field_name: values.str.replace(search, replace, n=count or -1, regex=False)}, {}
+
+
 def reflection_format(context, model, field_name, data, log, format='<format not set>'):
     """
 `format` reflection creates the field value using %-style formatting from the whole data dict
@@ -184,6 +282,24 @@ available parameters:
     return {field_name: value}, {}
 
 
+def vectorized_format(context, model, field_name, dataset, log, format='<format not set>'):
+    """
+    Vectorized version of the `format` reflection.
+
+    Only `%(column)s` placeholders are supported.
+    """
+    pieces = []
+    for position, part in enumerate(re.split(r'(%\([^)]*\)s|%%)', format)):
+        if position % 2:
+            pieces.append('%' if part == '%%' else dataset[part[2:-2]].astype(str))
+        elif '%' in part:
+            raise ValueError('Only %(column)s placeholders are supported')
+        elif part:
+            pieces.append(part)
+    start = Series([''] * len(dataset.index), index=dataset.index, dtype=object)
+    return {field_name: reduce(lambda result, piece: result + piece, pieces, start)}, {}
+
+
 def reflection_xformat(context, model, field_name, data, log, format='<format not set>'):
     """
 `xformat` reflection creates the field value using {}-style formatting from the whole data dict
@@ -217,6 +333,18 @@ available parameters:
     return {field_name: value}, {}
 
 
+def vectorized_enum(context, model, field_name, dataset, log, column=None, mapping={}):
+    """Vectorized version of the `enum` reflection"""
+    create, update = vectorized_direct(context, model, field_name, dataset, log, column=column)
+    if not create:
+        return {}, {}
+    values = create[field_name]
+    found = values.isin(list(mapping))
+    for value in values[~found].unique():
+        log.warning(_('Found a column value %s not in mapping: %s'), value, field_name)
+    return {field_name: values[found].map(lambda value: mapping[value])}, {}
+
+
 def reflection_combine(context, model, field_name, data, log, reflections=[]):
     """
 `combine` reflection applies several reflections sequentially,
@@ -249,7 +377,7 @@ available parameters:
     return c, u
 
 
-def reflection_lookup(context, model, field_name, data, log, column=None, lookup_field='pk'):
+def reflection_lookup(context, model, field_name, data, log, column=None, lookup_field='pk', preload=False):
     """
 `lookup` reflection is applied only to the foreign key or one-to-one
 field reference field.
@@ -257,10 +385,13 @@ field reference field.
 It lookups the column value in the `lookup_field` on the opposite side of
 the reference, and gets the found instance, or None, if not found.
 
+Found instances, as well as values not found, are cached while the import is processed.
+
 available parameters:
 
 - column - column name where to find a value, field name by default
 - lookup_field - field name of the opposide side model with the optional lookup suffix, 'pk' by default
+- preload - load the whole opposite side table at once, useful for small tables, false by default
     """
     field = _get_field(model, field_name)
     if not field:
@@ -271,5 +402,28 @@ available parameters:
         return {}, {}
     value = list(create.values())[0]
     remote_model = field.remote_field.model
-    value = remote_model.objects.filter(**{lookup_field: value}).last()
+    lookups = getattr(context, 'lookups', None)
+    if lookups is None:
+        value = remote_model.objects.filter(**{lookup_field: value}).last()
+    else:
+        value = lookups.resolve(remote_model, lookup_field, [value], preload=preload)[value]
     return {field_name: value}, {}
+
+
+def vectorized_lookup(context, model, field_name, dataset, log, column=None, lookup_field='pk', preload=False):
+    """Vectorized version of the `lookup` reflection resolving all distinct values of the chunk at once"""
+    field = _get_field(model, field_name)
+    if not field:
+        return {}, {}
+
+    create, update = vectorized_direct(context, model, field_name, dataset, log, column=column)
+    if not create:
+        return {}, {}
+    values = create[field_name]
+    found = context.lookups.resolve(field.remote_field.model, lookup_field, list(values.unique()), preload=preload)
+    return {field_name: values.map(lambda value: found[value])}, {}
+
+
+def prefetch_lookup(context, model, field_name, dataset, log, column=None, lookup_field='pk', preload=False):
+    """Resolves all distinct values of the chunk at once, before the `lookup` reflection is applied row by row"""
+    vectorized_lookup(context, model, field_name, dataset, log, column=column, lookup_field=lookup_field, preload=preload)
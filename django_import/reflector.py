@@ -1,10 +1,164 @@
+from collections import OrderedDict
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+
 from . import reflections
+from .config import get_options
+
+
+# Marker of values which are not valid for the lookup field
+INVALID = object()
+
+
+class LookupCache(object):
+    """
+    Cache of instances found by the `lookup` reflection.
+
+    Distinct values are resolved by the only query, and kept in the cache
+    of the limited size, evicting least recently used entries. Values not found
+    are cached also. Whole tables may be preloaded into the cache.
+    """
+    def __init__(self, size):
+        self.size = size
+        self.entries = OrderedDict()
+        self.tables = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """
+        Returns a pair of the flag whether the key is found, and the cached value
+        """
+        if key not in self.entries:
+            return False, None
+        value = self.entries.pop(key)
+        self.entries[key] = value
+        return True, value
+
+    def set(self, key, value):
+        self.entries[key] = value
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+    def field(self, model, lookup_field):
+        """
+        Returns a model field if the lookup field is a plain field name without any lookup suffix
+        """
+        if lookup_field == 'pk':
+            return model._meta.pk
+        try:
+            field = model._meta.get_field(lookup_field)
+        except FieldDoesNotExist:
+            return None
+        if field.is_relation or not getattr(field, 'attname', None):
+            return None
+        return field
+
+    def convert(self, field, value):
+        """
+        Returns the value converted by the lookup field, or `INVALID` if the value is not valid for the field
+        """
+        try:
+            return field.to_python(value)
+        except (ValidationError, ValueError, TypeError):
+            return INVALID
+
+    def query(self, model, lookup_field, values):
+        """
+        Lookups values in the database, returns a dictionary of found instances, or None if not found.
+
+        Values of the plain lookup field are resolved by the only query, values not found there are missing,
+        while values of lookups with suffixes, and `None` values, are resolved one by one.
+        Values which are not valid for the lookup field are not found.
+        """
+        found = {}
+        field = self.field(model, lookup_field)
+        queried = []
+        for value in values:
+            if value is None or not field:
+                continue
+            if self.convert(field, value) is INVALID:
+                found[value] = None
+            else:
+                queried.append(value)
+        if queried:
+            queryset = model.objects.filter(**{'%s__in' % lookup_field: queried})
+            if not queryset.ordered:
+                queryset = queryset.order_by('pk')
+            instances = {}
+            for instance in queryset:
+                instances[field.to_python(getattr(instance, field.attname))] = instance
+            for value in queried:
+                found[value] = instances.get(field.to_python(value))
+        for value in values:
+            if value not in found:
+                try:
+                    found[value] = model.objects.filter(**{lookup_field: value}).last()
+                except (ValidationError, ValueError, TypeError):
+                    found[value] = None
+        return found
+
+    def preload(self, model, lookup_field):
+        """
+        Returns a dictionary of all instances of the model by the lookup field value, or None if the
+        lookup field is not a plain field name
+        """
+        key = (model._meta.label_lower, lookup_field)
+        if key not in self.tables:
+            field = self.field(model, lookup_field)
+            if not field:
+                self.tables[key] = None
+            else:
+                queryset = model.objects.all()
+                if not queryset.ordered:
+                    queryset = queryset.order_by('pk')
+                self.tables[key] = dict((field.to_python(getattr(instance, field.attname)), instance) for instance in queryset)
+        return self.tables[key]
+
+    def resolve(self, model, lookup_field, values, preload=False):
+        """
+        Returns a dictionary of found instances, or None if not found, for every value from the list
+        """
+        found = {}
+        if preload:
+            table = self.preload(model, lookup_field)
+            if table is not None:
+                field = self.field(model, lookup_field)
+                for value in values:
+                    found[value] = table.get(self.convert(field, value))
+                self.hits += len(values)
+                return found
+        missed = []
+        for value in values:
+            try:
+                hit, instance = self.get((model._meta.label_lower, lookup_field, value))
+            except TypeError:
+                hit, instance = False, None
+            if hit:
+                found[value] = instance
+                self.hits += 1
+            else:
+                missed.append(value)
+        self.misses += len(missed)
+        if missed:
+            queried = self.query(model, lookup_field, missed)
+            for value in missed:
+                found[value] = queried[value]
+                try:
+                    self.set((model._meta.label_lower, lookup_field, value), queried[value])
+                except TypeError:
+                    pass
+        return found
 
 
 class Reflector(object):
     """
     Arbitrary context for the import process when evaluating reflections
     """
+    def __init__(self, lookup_cache_size=None):
+        if lookup_cache_size is None:
+            lookup_cache_size = get_options()['lookup_cache_size']
+        self.lookups = LookupCache(lookup_cache_size)
 
 
 def register_reflection(name, func):
@@ -21,7 +175,7 @@ def register_reflection(name, func):
         - `context` is an instance of the `Reflector`
         - `model` is a model to be filled
         - `field_name` - is a name of the field to be filled
-        - `data` - dictionary of all values got from the row
+        - `data` - read-only mapping of all values got from the row, column names as keys
         - `log` - instance of the ImportLog model to be used to send logs if necessary
         - `kwargs` - additional parameters which are used from the job options.reflections.<field_name>.parameters chapter
 
@@ -29,5 +183,12 @@ def register_reflection(name, func):
         - create - an instance is created or updated using `update_or_create()` function call
         - update - every value collected for this stage is assigned to the correspondent
           instance attribute, and the instance is saved
+
+    The optional vectorized version of the reflection function may be registered using
+    the `vectorized_<name>` name. It has the same signature, but gets the `dataset` chunk DataFrame
+    instead of the `data`, and returns dictionaries of pandas Series indexed by the chunk index
+    instead of values. Rows having no value for the field are just absent in the returned Series.
+    If the vectorized version is absent or raises an exception, the reflection function
+    is applied row by row.
     """
     setattr(reflections, name, func)
@@ -0,0 +1,123 @@
+"""
+Rejected rows are collected to the sidecar file instead of logging every failed row.
+
+Every rejected row is written as it has been read from the import file, before values are converted
+to kinds of model fields, with the number of the source row and the error reason in additional columns. Rejected rows are buffered,
+and written to the temporary file together, once per batch. When the import is finished,
+the file is stored to the configured storage and linked from the `ImportLog`.
+
+The file may be fixed and imported again directly, additional columns are ignored
+unless reflected explicitly.
+"""
+import os
+import tempfile
+
+import pandas
+
+from django.core.files import File
+
+
+try:
+    from django.utils.translation import ugettext_lazy as _
+except ImportError:
+    from django.utils.translation import gettext_lazy as _
+
+
+ROW_COLUMN = 'import_row'
+ERROR_COLUMN = 'import_error'
+
+REJECT_FORMATS = ['csv', 'jsonl']
+
+
+def reject_format(log, rejects, format, parameters):
+    """
+    Returns the format and `sep` of the rejects file by the `rejects` option.
+
+    If the option is `true`, the format of the import file is used where possible,
+    while other formats are written as `csv`.
+    """
+    if rejects is True:
+        if format == 'json' and parameters.get('lines', False):
+            return 'jsonl', None
+        if format in ('csv', 'table'):
+            return 'csv', parameters.get('sep', parameters.get('delimiter', ',' if format == 'csv' else '\t'))
+        return 'csv', ','
+    if rejects not in REJECT_FORMATS:
+        log.warning(_('Rejects format should be one of %s, got %s, csv is used'), ', '.join(REJECT_FORMATS), rejects)
+        rejects = 'csv'
+    return rejects, ','
+
+
+class RejectWriter(object):
+    """
+    Buffered writer of rejected rows
+    """
+    def __init__(self, log, format, sep=','):
+        self.log = log
+        self.format = format
+        self.sep = sep
+        self.columns = None
+        self.rows = []
+        self.count = 0
+        self.dataset = None
+        self.file = tempfile.TemporaryFile()
+
+    def track(self, chunks):
+        """
+        Yields all chunks, keeping the current source chunk to get source values of rejected rows
+        """
+        for dataset in chunks:
+            self.dataset = dataset
+            yield dataset
+        self.dataset = None
+
+    def source(self, data):
+        """
+        Returns the source of the row from the current chunk, to be rejected later, or the row itself if not tracked
+        """
+        return data if self.dataset is None else self.dataset
+
+    def reject(self, ind, source, error):
+        """
+        Appends the rejected row to the buffer, taking values from the source chunk, or the row
+        """
+        if isinstance(source, pandas.DataFrame):
+            row = dict(zip(source.columns, source.loc[ind]))
+        else:
+            row = dict(source.items())
+        if self.columns is None:
+            self.columns = [k for k in row if k not in (ROW_COLUMN, ERROR_COLUMN)] + [ROW_COLUMN, ERROR_COLUMN]
+        row[ROW_COLUMN] = ind
+        row[ERROR_COLUMN] = '%s' % error
+        self.rows.append(row)
+
+    def write(self):
+        """
+        Writes all buffered rows to the temporary file
+        """
+        if not self.rows:
+            return
+        dataset = pandas.DataFrame(self.rows, columns=self.columns)
+        if self.format == 'jsonl':
+            content = dataset.to_json(orient='records', lines=True, date_format='iso').rstrip('\n') + '\n'
+        else:
+            content = dataset.to_csv(sep=self.sep, header=not self.count, index=False)
+        self.file.write(content.encode('utf-8'))
+        self.count += len(self.rows)
+        self.rows = []
+
+    def close(self, name):
+        """
+        Stores the file to the storage linking it from the log, if any rows have been rejected
+        """
+        try:
+            self.write()
+            if not self.count:
+                return
+            self.file.seek(0)
+            name = '%s.rejects.%s' % (os.path.splitext(os.path.basename(name))[0], self.format)
+            self.log.rejects_file.save(name, File(self.file), save=False)
+            self.log.progress(rejects_file=self.log.rejects_file.name)
+            self.log.warning(_('%s rejected rows have been stored: %s'), self.count, self.log.rejects_file.name)
+        finally:
+            self.file.close()
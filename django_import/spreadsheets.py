@@ -0,0 +1,155 @@
+"""
+The spreadsheet reader imports several sheets of the workbook in a single job, and streams rows of `xlsx` files.
+
+If neither sheets nor the chunk size are passed, the file is read by `pandas.read_excel()` as usual.
+
+Otherwise the workbook is opened once, and sheets are read one by one, every sheet may have its own headers.
+Rows of `xlsx` sheets are streamed by `openpyxl` in the read-only mode, and collected to chunks of the limited size,
+so the memory consumption depends on the chunk size rather than the workbook size.
+Other workbooks, and `xlsx` workbooks read using parameters not supported by streaming,
+are read by `pandas` sheet by sheet, and sheets are split to chunks.
+
+Every chunk has the `sheet` attribute set to the sheet name or index, if pandas supports DataFrame attributes (1.0+).
+"""
+import pandas
+from six import string_types
+
+
+# Parameters of `pandas.read_excel()` supported by streaming
+STREAMED_PARAMETERS = ['sheet_name', 'header', 'skiprows', 'usecols', 'dtype', 'engine']
+
+
+def _format(file):
+    """Internal helper returning the workbook format, or None if unknown"""
+    try:
+        from pandas.io.excel._base import inspect_excel_format
+        return inspect_excel_format(file)
+    except Exception:
+        return None
+    finally:
+        if hasattr(file, 'seek'):
+            file.seek(0)
+
+
+def _sheets(sheets, sheet_name, names):
+    """Internal helper returning a list of sheets to be read, with their headers"""
+    if sheets is None:
+        sheets = [sheet_name]
+    elif sheets is True or sheets == 'all':
+        sheets = list(names)
+    elif not isinstance(sheets, list):
+        sheets = [sheets]
+    result = []
+    for sheet in sheets:
+        if isinstance(sheet, dict):
+            result.append((sheet.get('name', 0), sheet.get('headers', None)))
+        else:
+            result.append((sheet, None))
+    return result
+
+
+def _streamed(format, chunksize, parameters):
+    """Internal helper checking whether the workbook may be streamed using parameters"""
+    if not chunksize or format != 'xlsx':
+        return False
+    if set(parameters) - set(STREAMED_PARAMETERS) or parameters.get('engine', 'openpyxl') != 'openpyxl':
+        return False
+    usecols = parameters.get('usecols')
+    if usecols is not None and not callable(usecols):
+        if not isinstance(usecols, list) or not all(isinstance(c, string_types) for c in usecols):
+            return False
+    return isinstance(parameters.get('header', 0), int) or parameters.get('header', 0) is None
+
+
+def _finish(dataset, sheet, headers=None, usecols=None, dtype=None):
+    """Internal helper replacing headers, selecting columns, and converting types of the chunk"""
+    if headers:
+        dataset = dataset.rename(columns=dict(zip(list(dataset.columns), headers)))
+    if usecols is not None:
+        select = usecols if callable(usecols) else set(usecols).__contains__
+        dataset = dataset[[c for c in dataset.columns if select(c)]].copy()
+    if dtype is not None:
+        for column in dataset.columns:
+            kind = dtype.get(column) if isinstance(dtype, dict) else dtype
+            if kind is str:
+                dataset[column] = dataset[column].map(str, na_action='ignore')
+            elif kind is not None:
+                dataset[column] = dataset[column].astype(kind)
+    if hasattr(dataset, 'attrs'):
+        dataset.attrs['sheet'] = sheet
+    return dataset
+
+
+def _frame(rows, columns):
+    """Internal helper creating the DataFrame from rows of values, padded to the same length"""
+    width = len(columns) if columns is not None else max([len(row) for row in rows] or [0])
+    return pandas.DataFrame.from_records([(tuple(row) + (None,) * width)[:width] for row in rows], columns=columns)
+
+
+def _stream(file, chunksize, sheets, parameters):
+    """Internal helper streaming sheets of the `xlsx` workbook"""
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(file, read_only=True, data_only=True, keep_links=False)
+    try:
+        for sheet, headers in _sheets(sheets, parameters.get('sheet_name', 0), workbook.sheetnames):
+            worksheet = workbook[sheet] if isinstance(sheet, string_types) else workbook.worksheets[sheet]
+            rows = worksheet.iter_rows(values_only=True)
+            for skipped in range(parameters.get('skiprows', None) or 0):
+                next(rows, None)
+            header = parameters.get('header', 0)
+            columns = None
+            if header is not None:
+                for skipped in range(header):
+                    next(rows, None)
+                names = next(rows, None) or ()
+                columns = [
+                    name if name is not None else 'Unnamed: %s' % position
+                    for position, name in enumerate(names)
+                ]
+            usecols, dtype = parameters.get('usecols'), parameters.get('dtype')
+            chunk = []
+            for row in rows:
+                if all(value is None for value in row):
+                    continue
+                chunk.append(row)
+                if len(chunk) >= chunksize:
+                    yield _finish(_frame(chunk, columns), sheet, headers, usecols, dtype)
+                    chunk = []
+            if chunk or columns is not None:
+                yield _finish(_frame(chunk, columns), sheet, headers, usecols, dtype)
+    finally:
+        workbook.close()
+
+
+def _parse(file, chunksize, sheets, parameters):
+    """Internal helper reading sheets of the workbook one by one using pandas"""
+    parameters = dict(parameters)
+    excel = pandas.ExcelFile(file, engine=parameters.pop('engine', None))
+    try:
+        for sheet, headers in _sheets(sheets, parameters.pop('sheet_name', 0), excel.sheet_names):
+            params = dict(parameters)
+            usecols = dtype = None
+            if headers:
+                usecols, dtype = params.pop('usecols', None), params.pop('dtype', None)
+            dataset = _finish(excel.parse(sheet, **params), sheet, headers, usecols, dtype)
+            size = chunksize or len(dataset.index) or 1
+            for start in range(0, max(len(dataset.index), 1), size):
+                yield dataset.iloc[start:start + size]
+    finally:
+        excel.close()
+
+
+def read_excel(file, chunksize=None, sheets=None, **parameters):
+    """
+    Reads the workbook, returns the DataFrame, or the iterator of DataFrame chunks
+    if the `chunksize` or `sheets` are passed.
+
+    The `sheets` is either a list of sheet names or indexes, or `true` to read all sheets.
+    Every list item may also be a dictionary, having the sheet `name` and its `headers` replacing headers of the sheet.
+    """
+    if not chunksize and sheets is None:
+        return pandas.read_excel(file, **parameters)
+    if _streamed(_format(file), chunksize, parameters):
+        return _stream(file, chunksize, sheets, parameters)
+    return _parse(file, chunksize, sheets, parameters)
@@ -1,6 +1,7 @@
 from celery import shared_task
 
-from .import_task import run_import
+from .import_task import resume_import, run_import
 
 
 run_import = shared_task(run_import, track_started=True)
+resume_import = shared_task(resume_import, track_started=True)
@@ -0,0 +1,152 @@
+"""
+Validation replaces writers when the import is started in the dry-run mode.
+
+Every reflected row is validated by model fields and the model `clean()` method
+instead of storing it to the database. Errors are counted by the field, and by the error type,
+to report them when the dry run is finished.
+"""
+import time
+from collections import Counter
+from decimal import Decimal
+
+from django.core.exceptions import (
+    NON_FIELD_ERRORS,
+    FieldDoesNotExist,
+    ValidationError,
+)
+from django.db import models
+
+
+try:
+    from django.utils.translation import ugettext_lazy as _
+except ImportError:
+    from django.utils.translation import gettext_lazy as _
+
+
+class ReflectionError(ValueError):
+    """
+    Error raised by the reflection of the field
+    """
+    def __init__(self, field_name, error):
+        super(ReflectionError, self).__init__(field_name, error)
+        self.field_name = field_name
+        self.error = error
+
+    def __str__(self):
+        return '%s' % self.error
+
+
+def _counts(counter):
+    """Internal helper formatting counter values"""
+    return ', '.join('%s: %s' % (k, v) for k, v in counter.most_common()) or '-'
+
+
+def _throughput(rows, seconds):
+    """Internal helper formatting rows per second"""
+    if not seconds:
+        return '-'
+    return '%.1f' % (rows / seconds)
+
+
+def _decimal(model, field_name, value):
+    """
+    Internal helper converting float values of decimal fields using the shortest representation,
+    the same way as the database rounds them, instead of the exact binary value
+    """
+    if isinstance(value, float):
+        try:
+            field = model._meta.get_field(field_name)
+        except FieldDoesNotExist:
+            return value
+        if isinstance(field, models.DecimalField):
+            return Decimal(str(value))
+    return value
+
+
+class Validator(object):
+    """
+    Validates reflected rows instead of storing them, and collects error statistics
+    """
+    def __init__(self, model):
+        self.model = model
+        self.columns = Counter()
+        self.types = Counter()
+        self.seconds = 0.0
+
+    def count(self, error):
+        """
+        Counts the reflection or validation error by the field, and by the error type
+        """
+        if isinstance(error, ValidationError) and hasattr(error, 'error_dict'):
+            for field_name, errors in error.error_dict.items():
+                for e in errors:
+                    self.columns[field_name] += 1
+                    self.types[e.code or 'invalid'] += 1
+        elif isinstance(error, ValidationError):
+            for e in error.error_list:
+                self.columns[NON_FIELD_ERRORS] += 1
+                self.types[e.code or 'invalid'] += 1
+        elif isinstance(error, ReflectionError):
+            self.columns[error.field_name] += 1
+            self.types[error.error.__class__.__name__] += 1
+        else:
+            self.columns[NON_FIELD_ERRORS] += 1
+            self.types[error.__class__.__name__] += 1
+
+    def validate_row(self, create, update):
+        """
+        Validates reflected values of the single row, raises `ValidationError` if not valid.
+
+        Only reflected fields are validated, relations resolved to instances are not checked again.
+        """
+        values = {}
+        values.update(create)
+        values.update(update)
+        instance = self.model()
+        for k in values:
+            setattr(instance, k, _decimal(self.model, k, values[k]))
+        exclude = [
+            f.name for f in self.model._meta.fields
+            if f.name not in values or isinstance(values[f.name], models.Model)
+        ]
+        instance.clean_fields(exclude=exclude)
+        instance.clean()
+
+    def validate_batch(self, log, batch, rejected=None):
+        """
+        Validates batch items, the same way as writers store them.
+
+        Errors are logged, or collected to the `rejected` list of item and error pairs if passed.
+        Returns a number of valid rows.
+        """
+        started = time.time()
+        valid = 0
+        for item in batch:
+            ind, create, update = item
+            try:
+                self.validate_row(create, update)
+            except ValidationError as ex:
+                self.count(ex)
+                if rejected is not None:
+                    rejected.append((item, ex))
+                    continue
+                row, log.row = getattr(log, 'row', None), ind
+                log.error(_("Validation error: create %r, update %r, %s"), create, update, ex)
+                log.row = row
+                continue
+            valid += 1
+        self.seconds += time.time() - started
+        return valid
+
+    def report(self, log, rows, timings):
+        """
+        Logs error counts, and the throughput of every stage
+        """
+        log.info(_('Errors by field: %s'), _counts(self.columns))
+        log.info(_('Errors by type: %s'), _counts(self.types))
+        log.info(
+            _('Throughput, rows per second: read %s, reflect %s, validate %s'),
+            _throughput(rows, timings.get('read', 0) + timings.get('headers', 0)),
+            _throughput(rows, sum(v for k, v in timings.items() if k.split(':')[0] == 'reflect')),
+            _throughput(rows, self.seconds),
+        )
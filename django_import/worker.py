@@ -0,0 +1,149 @@
+"""
+The database queue allows to start imports asynchronously without Celery.
+
+Imports are queued as `ImportRun` instances, and processed by workers started by the `import_worker` command.
+Every worker claims the oldest queued run, locking it by `select_for_update(skip_locked=True)` where supported,
+and reports heartbeats while the import is processed. Runs whose heartbeats have not been reported
+during `queue_timeout` seconds are considered lost, and claimed again to resume the import from the checkpoint.
+The worker which has lost its run, because it has been claimed by another worker, aborts the import.
+"""
+import logging
+import os
+import socket
+import threading
+from datetime import timedelta
+
+from django.db import (
+    close_old_connections,
+    connection,
+    connections,
+    router,
+    transaction,
+)
+from django.db.models import F, Q
+from django.utils import timezone
+
+
+try:
+    from django.utils.translation import ugettext_lazy as _
+except ImportError:
+    from django.utils.translation import gettext_lazy as _
+
+from .config import get_options
+
+
+logger = logging.getLogger(__name__)
+
+
+def worker_name(number=0):
+    """
+    Returns a unique name of the worker
+    """
+    return '%s:%s:%s' % (socket.gethostname(), os.getpid(), number)
+
+
+def claim(name):
+    """
+    Claims the oldest queued or lost run by the worker, returns the run, or None if nothing to process
+    """
+    from .models import ImportRun
+
+    stale = timezone.now() - timedelta(seconds=get_options()['queue_timeout'])
+    features = connections[router.db_for_write(ImportRun)].features
+    kwargs = {'skip_locked': True} if getattr(features, 'has_select_for_update_skip_locked', False) else {}
+    with transaction.atomic():
+        run = ImportRun.objects.select_for_update(**kwargs).filter(
+            Q(claimed_at__isnull=True) | Q(heartbeat_at__lt=stale)
+        ).order_by('id').first()
+        if not run:
+            return None
+        now = timezone.now()
+        if not ImportRun.objects.filter(id=run.id, attempts=run.attempts).update(
+            claimed_by=name, claimed_at=now, heartbeat_at=now, attempts=F('attempts') + 1
+        ):
+            return None
+    run.claimed_by, run.claimed_at, run.heartbeat_at, run.attempts = name, now, now, run.attempts + 1
+    return run
+
+
+class Heartbeat(threading.Thread):
+    """
+    Thread reporting heartbeats of the claimed run every `queue_heartbeat` seconds.
+
+    If the run is not claimed by the worker anymore, the `lost` event is set, and heartbeats are stopped.
+    """
+    def __init__(self, run):
+        super(Heartbeat, self).__init__()
+        self.daemon = True
+        self.import_run = run
+        self.stopped = threading.Event()
+        self.lost = threading.Event()
+
+    def run(self):
+        from .models import ImportRun
+
+        interval = get_options()['queue_heartbeat']
+        try:
+            while not self.stopped.wait(interval):
+                if not ImportRun.objects.filter(
+                    id=self.import_run.id, claimed_by=self.import_run.claimed_by
+                ).update(heartbeat_at=timezone.now()):
+                    self.lost.set()
+                    break
+        finally:
+            connection.close()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def process(run):
+    """
+    Processes the claimed run, and removes it from the queue.
+
+    The run claimed again after the worker has been lost, is resumed from the checkpoint,
+    unless the number of attempts exceeds the `queue_attempts` setting.
+    The import is aborted, if the run has been claimed by another worker meanwhile.
+    """
+    from .import_task import resume_import, run_import
+    from .models import ImportRun
+
+    attempts = get_options()['queue_attempts']
+    if run.attempts > attempts:
+        log = run.log
+        log.error(_('Import has been abandoned after %s attempts'), attempts)
+        log.finish()
+        ImportRun.objects.filter(id=run.id).delete()
+        return
+    heartbeat = Heartbeat(run)
+    heartbeat.start()
+    try:
+        if run.resume or run.attempts > 1:
+            resume_import(run.log_id, heartbeat.lost)
+        else:
+            run_import(run.log_id, heartbeat.lost)
+    finally:
+        heartbeat.stop()
+        ImportRun.objects.filter(id=run.id, claimed_by=run.claimed_by).delete()
+
+
+def work(name, stop, once=False, sleep=1.0):
+    """
+    Processes queued runs until the `stop` event is set, or until the queue is empty, if `once` is set.
+
+    Unexpected errors, like lost database connections, are logged, and the worker continues.
+    """
+    while not stop.is_set():
+        close_old_connections()
+        try:
+            run = claim(name)
+            if run:
+                process(run)
+                continue
+        except Exception:
+            logger.exception('Import worker %s failed', name)
+            close_old_connections()
+        if once:
+            break
+        stop.wait(sleep)
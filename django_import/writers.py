@@ -0,0 +1,300 @@
+"""
+Writers store reflected data rows to the database.
+
+Every reflected data row is a pair of `create` and `update` dictionaries
+returned by reflections.
+
+The row-by-row writer creates (or updates using the identity) every row in its own
+transaction, while the batch writer stores several rows in a single transaction.
+If the batch fails, it is bisected to find and skip wrong rows.
+"""
+from functools import reduce
+from operator import or_
+
+from django.db import DatabaseError, connections, router, transaction
+from django.db.models import Q
+
+
+try:
+    from django.db.models import UniqueConstraint
+except ImportError:
+    UniqueConstraint = None
+
+
+try:
+    from django.utils.translation import ugettext_lazy as _
+except ImportError:
+    from django.utils.translation import gettext_lazy as _
+
+
+def store_row(model, identity, create, update):
+    """
+    Stores a single reflected row.
+
+    The instance is found using `update_or_create()` if identity values
+    are present in the `create` dictionary, or just created otherwise.
+    The `update` values are assigned to the instance attributes, and the instance is saved again.
+    """
+    ident = dict([(k, v) for k, v in create.items() if k in identity])
+    if ident:
+        instance, created = model.objects.update_or_create(defaults=create, **ident)
+    else:
+        instance = model.objects.create(**create)
+    if update:
+        for k in update:
+            setattr(instance, k, update[k])
+        instance.save()
+    return instance
+
+
+def write_row(model, identity, create, update):
+    """
+    Writes a single reflected row in its own transaction.
+    """
+    with transaction.atomic():
+        return store_row(model, identity, create, update)
+
+
+def try_write_row(log, model, identity, create, update):
+    """
+    Writes a single reflected row logging the database error if happens.
+
+    Returns True if the row has been written successfully.
+    """
+    try:
+        write_row(model, identity, create, update)
+    except DatabaseError as ex:
+        log.error(_("Database error while importing data: create %r, update %r, %s"), create, update, ex)
+        return False
+    return True
+
+
+def reject_row(log, item, ex, rejected=None):
+    """
+    Logs the database error of the batch item,
+    or collects it to the `rejected` list of item and error pairs, if passed
+    """
+    if rejected is not None:
+        rejected.append((item, ex))
+        return
+    ind, create, update = item
+    row, log.row = getattr(log, 'row', None), ind
+    log.error(_("Database error while importing data: create %r, update %r, %s"), create, update, ex)
+    log.row = row
+
+
+def write_rows(log, model, identity, batch, rejected=None):
+    """
+    Writes batch items one by one, every row in its own transaction.
+
+    Database errors are logged, or collected to the `rejected` list if passed.
+    Returns a number of successfully stored rows.
+    """
+    written = 0
+    for item in batch:
+        ind, create, update = item
+        try:
+            write_row(model, identity, create, update)
+        except DatabaseError as ex:
+            reject_row(log, item, ex, rejected)
+            continue
+        written += 1
+    return written
+
+
+def _identity_key(model, names, values):
+    """Internal helper to get comparable identity key from identity field values"""
+    key = []
+    for name, value in zip(names, values):
+        field = model._meta.get_field(name)
+        if field.is_relation:
+            value = getattr(value, 'pk', value)
+        else:
+            value = field.to_python(value)
+        key.append(value)
+    return tuple(key)
+
+
+def _segments(batch, identity):
+    """
+    Internal helper splitting the batch to the sequence of segments where every identity
+    is met only once, and all rows have the same set of identity fields, keeping the order of the batch.
+    Rows having no identity fields make their own segments.
+    """
+    segment, names, keys = [], None, set()
+    for create in batch:
+        ident = tuple(sorted(k for k in create if k in identity))
+        key = tuple(create[k] for k in ident)
+        try:
+            duplicated = bool(ident) and key in keys
+        except TypeError:
+            duplicated = True
+        if segment and (ident != names or duplicated):
+            yield names, segment
+            segment, keys = [], set()
+        segment.append(create)
+        names = ident
+        try:
+            keys.add(key)
+        except TypeError:
+            pass
+    if segment:
+        yield names, segment
+
+
+def _unique_sets(model):
+    """Internal helper returning a list of field name sets which are unique for the model"""
+    sets = [set([f.name]) for f in model._meta.concrete_fields if f.unique]
+    sets += [set(u) for u in model._meta.unique_together]
+    for constraint in getattr(model._meta, 'constraints', []):
+        if UniqueConstraint and isinstance(constraint, UniqueConstraint) and constraint.fields and constraint.condition is None:
+            sets.append(set(constraint.fields))
+    return sets
+
+
+def _update_fields(model, names, segment):
+    """Internal helper returning concrete field names to be updated for the existent instances"""
+    concrete = set(f.name for f in model._meta.concrete_fields if not f.primary_key)
+    fields = set()
+    for create in segment:
+        fields.update(k for k in create if k in concrete and k not in names)
+    return sorted(fields)
+
+
+def _upsert_conflicts(model, names, segment, fields):
+    """
+    Internal helper trying to upsert a segment using the only `bulk_create()` call resolving conflicts.
+
+    Returns False if the database or the model doesn't support it, or some rows don't have all updated fields,
+    since missing fields would be overwritten by defaults of the model.
+    """
+    connection = connections[router.db_for_write(model)]
+    if not fields or not getattr(connection.features, 'supports_update_conflicts_with_target', False):
+        return False
+    if set(names) not in _unique_sets(model):
+        return False
+    if any(k not in create for create in segment for k in fields):
+        return False
+    instances = [model(**create) for create in segment]
+    model.objects.bulk_create(
+        instances, batch_size=len(instances),
+        update_conflicts=True, unique_fields=list(names), update_fields=fields
+    )
+    return True
+
+
+def _upsert_segment(model, names, segment):
+    """
+    Internal helper to upsert a segment of rows having unique identities.
+
+    Existent instances are selected by the only query, updated using `bulk_update()`,
+    while the rest are created using `bulk_create()`.
+    """
+    fields = _update_fields(model, names, segment)
+    if _upsert_conflicts(model, names, segment, fields):
+        return
+    keys = [_identity_key(model, names, [create[k] for k in names]) for create in segment]
+    if len(names) == 1:
+        queryset = model.objects.filter(**{'%s__in' % names[0]: [create[names[0]] for create in segment]})
+    else:
+        queryset = model.objects.filter(reduce(or_, [Q(**dict((k, create[k]) for k in names)) for create in segment]))
+    attnames = [model._meta.get_field(k).attname for k in names]
+    existent = {}
+    for instance in queryset:
+        key = _identity_key(model, names, [getattr(instance, k) for k in attnames])
+        if key in existent:
+            raise model.MultipleObjectsReturned(
+                'get() returned more than one %s -- it returned more than one!' % model._meta.object_name
+            )
+        existent[key] = instance
+    created, updated = [], []
+    for key, create in zip(keys, segment):
+        instance = existent.get(key)
+        if instance is None:
+            created.append(model(**create))
+            continue
+        for k in create:
+            setattr(instance, k, create[k])
+        updated.append(instance)
+    if created:
+        model.objects.bulk_create(created, batch_size=len(created))
+    if updated and fields:
+        if hasattr(model.objects, 'bulk_update'):
+            model.objects.bulk_update(updated, fields, batch_size=len(updated))
+        else:
+            for instance in updated:
+                instance.save(update_fields=fields)
+
+
+def store_creates(model, identity, creates):
+    """
+    Stores a list of `create` dictionaries using bulk operations, in order of the list.
+
+    Consequent identity-less rows are created using the only `bulk_create()` call.
+    Identities of identified rows are resolved by the only query, then
+    new instances are created using `bulk_create()`, and existent ones are
+    updated using `bulk_update()`. If the database supports it, and identity fields
+    are unique, the only `bulk_create()` call resolving conflicts is used instead.
+
+    Found instances are matched to rows by identity values converted by `to_python()` of fields,
+    so values which are equal only by the database collation, like case-insensitive strings on MySQL,
+    are not matched, and such rows are created as new instances.
+    """
+    for names, segment in _segments(creates, identity):
+        if names:
+            _upsert_segment(model, names, segment)
+        else:
+            model.objects.bulk_create([model(**create) for create in segment], batch_size=len(segment))
+
+
+def store_batch(model, identity, batch, bulk=True):
+    """
+    Stores a batch of reflected rows, every row is a tuple of the row number, `create` and `update` dictionaries.
+
+    If `bulk` is set, consequent rows having no values for the update stage are stored
+    using bulk operations by `store_creates()`, while other rows are stored one by one by `store_row()`.
+    """
+    creates = []
+    for ind, create, update in batch:
+        if bulk and not update:
+            creates.append(create)
+            continue
+        store_creates(model, identity, creates)
+        creates = []
+        store_row(model, identity, create, update)
+    store_creates(model, identity, creates)
+
+
+def _bisect_batch(log, model, identity, batch, bulk, top=False, rejected=None):
+    """
+    Internal helper writing the batch in its own transaction,
+    bisecting it recursively if fails, to find and skip wrong rows.
+    """
+    try:
+        with transaction.atomic():
+            store_batch(model, identity, batch, bulk)
+    except DatabaseError as ex:
+        if len(batch) == 1:
+            reject_row(log, batch[0], ex, rejected)
+            return 0
+        if top:
+            log.warning(_("Database error while importing a batch of %s rows, looking for wrong rows: %s"), len(batch), ex)
+        middle = len(batch) // 2
+        written = _bisect_batch(log, model, identity, batch[:middle], bulk, rejected=rejected)
+        return written + _bisect_batch(log, model, identity, batch[middle:], bulk, rejected=rejected)
+    return len(batch)
+
+
+def write_batch(log, model, identity, batch, bulk=True, rejected=None):
+    """
+    Writes a batch of reflected rows in a single transaction.
+
+    If the batch can not be stored as a whole, it is bisected to find
+    wrong rows, which are logged, or collected to the `rejected` list if passed,
+    and skipped, while all other rows are stored.
+
+    Returns a number of successfully stored rows.
+    """
+    if not batch:
+        return 0
+    return _bisect_batch(log, model, identity, batch, bulk, top=True, rejected=rejected)
@@ -40,7 +40,7 @@ setup(
     ],
     keywords="CSV JSON TSV import django fixture",
     license='LGPL',
-    packages=["django_import", "django_import.migrations"],
+    packages=["django_import", "django_import.migrations", "django_import.management", "django_import.management.commands"],
     include_package_data=True,
     zip_safe=False,
     install_requires=[